@@ -0,0 +1,442 @@
+import heapq
+import ipaddress
+import socket
+import struct
+
+
+class PortAllocator(object):
+    """
+    Keeps track of the used ports of a device. Membership checks, reservations and
+    allocation of the lowest free port are all O(1) amortized (O(log n) when ports
+    have been released). Ports are remembered in the order they were taken, which is
+    the order they are saved in.
+    """
+
+    def __init__(self, ports=()) -> None:
+        # Dict used as an insertion ordered set
+        self._used = {}
+        # All ports below _next are either used or in _released
+        self._next = 0
+        self._released = []
+        for port in ports:
+            self.reserve(port)
+
+    def __contains__(self, port):
+        return port in self._used
+
+    def __len__(self):
+        return len(self._used)
+
+    def __iter__(self):
+        return iter(self._used)
+
+    def reserve(self, port):
+        """
+        Marks a port as used
+
+        Returns:
+            bool: False if the port was already used
+        """
+        if port in self._used:
+            return False
+        self._used[port] = None
+        return True
+
+    def reserve_range(self, start, stop):
+        """
+        Marks all ports in range(start, stop) as used. Nothing is reserved if any of
+        the ports is already used.
+
+        Returns:
+            bool: False if any of the ports was already used
+        """
+        ports = range(start, stop)
+        used = self._used
+        if any(port in used for port in ports):
+            return False
+        for port in ports:
+            used[port] = None
+        return True
+
+    def release(self, port):
+        """
+        Frees a used port so it can be allocated again
+        """
+        if port in self._used:
+            del self._used[port]
+            if isinstance(port, int) and 0 <= port < self._next:
+                heapq.heappush(self._released, port)
+
+    def allocate(self):
+        """
+        Reserves and returns the lowest free port
+        """
+        used = self._used
+        released = self._released
+        while released:
+            port = heapq.heappop(released)
+            # Released ports may have been reserved again since
+            if port not in used:
+                used[port] = None
+                return port
+
+        port = self._next
+        while port in used:
+            port += 1
+        used[port] = None
+        self._next = port + 1
+        return port
+
+    def allocate_many(self, count):
+        """
+        Reserves and returns the count lowest free ports
+        """
+        return [self.allocate() for _ in range(count)]
+
+    def to_list(self):
+        return list(self._used)
+
+
+class IdAllocator(object):
+    """
+    Allocates unique integers from the range [first, last], lowest free value first.
+    Everything below an allocation cursor is in use, except for released values, and
+    values reserved ahead of the cursor are kept in a set. Allocating a block of K
+    values therefore costs O(K) without any per value lookups, and the whole state
+    can be saved with to_dict without listing every used value.
+    """
+
+    def __init__(self, first=0, last=None) -> None:
+        self.first = first
+        self.last = last
+
+        self._next = first
+        # Values >= _next reserved out of order, with a heap for the smallest one
+        self._ahead = set()
+        self._ahead_heap = []
+        # Values < _next that have been released
+        self._released = set()
+        self._released_heap = []
+
+    def __contains__(self, value):
+        return self.is_used(value)
+
+    def __len__(self):
+        return self._next - self.first - len(self._released) + len(self._ahead)
+
+    def _in_range(self, value):
+        if not isinstance(value, int) or value < self.first:
+            return False
+        return self.last is None or value <= self.last
+
+    def is_used(self, value):
+        if not self._in_range(value):
+            return False
+        if value < self._next:
+            return value not in self._released
+        return value in self._ahead
+
+    def reserve(self, value):
+        """
+        Marks a value as used, e.g. a value given by the user
+
+        Returns:
+            bool: False if the value was already used or is outside the range
+        """
+        if not self._in_range(value):
+            return False
+        if value < self._next:
+            if value in self._released:
+                # Removed from the heap lazily
+                self._released.remove(value)
+                return True
+            return False
+        if value in self._ahead:
+            return False
+        if value == self._next:
+            self._next += 1
+            self._advance()
+        else:
+            self._ahead.add(value)
+            heapq.heappush(self._ahead_heap, value)
+        return True
+
+    def release(self, value):
+        """
+        Returns a value to the allocator
+        """
+        if not self.is_used(value):
+            return
+        if value < self._next:
+            self._released.add(value)
+            heapq.heappush(self._released_heap, value)
+        else:
+            self._ahead.remove(value)
+
+    def allocate_ints(self, count=1):
+        """
+        Allocates count free values, lowest released values first
+
+        Returns:
+            list: Allocated values
+        """
+        values = []
+        released = self._released
+        released_heap = self._released_heap
+        while released_heap and len(values) < count:
+            value = heapq.heappop(released_heap)
+            if value in released:
+                released.remove(value)
+                values.append(value)
+
+        remaining = count - len(values)
+        while remaining > 0:
+            if self.last is not None and self._next > self.last:
+                # Give back what was taken, the allocation is all or nothing
+                for value in values:
+                    self.release(value)
+                raise ValueError(f"{self._describe()} is exhausted")
+
+            # Take the longest free run up to the next out of order reservation
+            end = self._next + remaining
+            if self.last is not None:
+                end = min(end, self.last + 1)
+            next_ahead = self._peek_ahead()
+            if next_ahead is not None:
+                end = min(end, next_ahead)
+            values.extend(range(self._next, end))
+            remaining -= end - self._next
+            self._next = end
+            self._advance()
+
+        return values
+
+    def allocate(self):
+        """
+        Allocates the lowest free value
+        """
+        return self.allocate_ints(1)[0]
+
+    def to_dict(self):
+        return {
+            "next": self._next,
+            "reserved": sorted(self._ahead),
+            "released": sorted(self._released),
+        }
+
+    def load_dict(self, state):
+        """
+        Restores a state saved with to_dict
+        """
+        self._next = state["next"]
+        self._ahead = set(state["reserved"])
+        self._ahead_heap = sorted(self._ahead)
+        self._released = set(state["released"])
+        self._released_heap = sorted(self._released)
+
+    def _describe(self):
+        return f"Id range {self.first}-{self.last}"
+
+    def _advance(self):
+        # Step the cursor over values reserved ahead of it
+        ahead = self._ahead
+        while self._next in ahead:
+            ahead.remove(self._next)
+            self._next += 1
+
+    def _peek_ahead(self):
+        heap = self._ahead_heap
+        while heap and (heap[0] not in self._ahead or heap[0] < self._next):
+            heapq.heappop(heap)
+        return heap[0] if heap else None
+
+
+class AddressPool(IdAllocator):
+    """
+    Pool of IPv4 addresses in a CIDR network. Addresses are handled as 32 bit ints,
+    see IdAllocator, but can be given as strings to all functions.
+    """
+
+    def __init__(self, network) -> None:
+        self.network = ipaddress.IPv4Network(network, strict=False)
+        first = int(self.network.network_address)
+        last = int(self.network.broadcast_address)
+        if self.network.prefixlen <= 30:
+            # Skip network and broadcast addresses
+            first += 1
+            last -= 1
+        super().__init__(first, last)
+
+    def in_pool(self, addr):
+        return self._in_range(ipv4_to_int(addr))
+
+    def is_used(self, addr):
+        return super().is_used(ipv4_to_int(addr))
+
+    def reserve(self, addr):
+        return super().reserve(ipv4_to_int(addr))
+
+    def release(self, addr):
+        super().release(ipv4_to_int(addr))
+
+    def allocate(self):
+        """
+        Allocates one free address
+
+        Returns:
+            str: The address, ex 192.168.0.1
+        """
+        return int_to_ipv4(self.allocate_ints(1)[0])
+
+    def allocate_many(self, count):
+        """
+        Allocates count free addresses
+
+        Returns:
+            list: The addresses as strings
+        """
+        return ints_to_ipv4(self.allocate_ints(count))
+
+    def _describe(self):
+        return f"Address pool {self.network}"
+
+
+class MacPool(object):
+    """
+    Pool of MAC addresses under a 24 bit OUI, handed out from a counter. The default
+    OUI 02:00:00 has the locally administered bit set, so generated addresses never
+    clash with vendor assigned ones. All used MACs, including user supplied ones
+    outside the OUI, are kept as ints in a set for O(1) collision checks.
+    """
+
+    def __init__(self, oui="02:00:00") -> None:
+        self.oui = oui
+        self._base = mac_to_int(oui + ":00:00:00")
+        self._counter = 1
+        self._used = set()
+
+    def __contains__(self, mac):
+        return self.is_used(mac)
+
+    def __len__(self):
+        return len(self._used)
+
+    def is_used(self, mac):
+        return mac_to_int(mac) in self._used
+
+    def reserve(self, mac):
+        """
+        Marks a MAC as used, e.g. a MAC given by the user
+
+        Returns:
+            bool: False if the MAC was already used
+        """
+        mac = mac_to_int(mac)
+        if mac in self._used:
+            return False
+        self._used.add(mac)
+        return True
+
+    def release(self, mac):
+        self._used.discard(mac_to_int(mac))
+
+    def allocate_ints(self, count=1):
+        """
+        Allocates count unused MACs in counter order
+
+        Returns:
+            list: Allocated MACs as ints
+        """
+        used = self._used
+        base = self._base
+        counter = self._counter
+
+        # Fast path for a block without any reserved MACs in it
+        low = base + counter
+        high = low + count
+        if counter + count <= 1 << 24 and len(used) < count:
+            if not any(low <= mac < high for mac in used):
+                macs = list(range(low, high))
+                used.update(macs)
+                self._counter = counter + count
+                return macs
+
+        macs = []
+        while len(macs) < count:
+            if counter >= 1 << 24:
+                used.difference_update(macs)
+                raise ValueError(f"MAC pool {self.oui} is exhausted")
+            mac = base + counter
+            counter += 1
+            if mac not in used:
+                used.add(mac)
+                macs.append(mac)
+        self._counter = counter
+        return macs
+
+    def allocate(self):
+        """
+        Allocates one unused MAC
+
+        Returns:
+            str: The MAC, ex 02:00:00:00:00:01
+        """
+        return int_to_mac(self.allocate_ints(1)[0])
+
+    def to_dict(self):
+        return {"oui": self.oui, "counter": self._counter}
+
+    def load_dict(self, state):
+        """
+        Restores a state saved with to_dict
+        """
+        self._counter = state["counter"]
+
+    def allocate_many(self, count):
+        """
+        Allocates count unused MACs
+
+        Returns:
+            list: The MACs as strings
+        """
+        return ints_to_mac(self.allocate_ints(count))
+
+
+def mac_to_int(mac):
+    if isinstance(mac, int):
+        return mac
+    value = mac.replace(":", "").replace("-", "")
+    if len(value) != 12:
+        raise ValueError(f"Invalid MAC address {mac}")
+    return int(value, 16)
+
+
+def int_to_mac(mac):
+    v = "%012x" % mac
+    return f"{v[0:2]}:{v[2:4]}:{v[4:6]}:{v[6:8]}:{v[8:10]}:{v[10:12]}"
+
+
+def ints_to_mac(macs):
+    """
+    Converts a sequence of 48 bit ints to MAC address strings
+    """
+    return [int_to_mac(mac) for mac in macs]
+
+
+def ipv4_to_int(addr):
+    if isinstance(addr, int):
+        return addr
+    return struct.unpack("!I", socket.inet_pton(socket.AF_INET, addr))[0]
+
+
+def int_to_ipv4(addr):
+    return socket.inet_ntoa(struct.pack("!I", addr))
+
+
+def ints_to_ipv4(addrs):
+    """
+    Converts a sequence of 32 bit ints to IPv4 address strings
+    """
+    inet_ntoa = socket.inet_ntoa
+    pack = struct.Struct("!I").pack
+    return [inet_ntoa(pack(addr)) for addr in addrs]
@@ -1,11 +1,99 @@
 from re import L
 from .model import Node, Switch, Link, NetworkSetup
+from . import json_stream, routing
+from .allocators import (
+    AddressPool,
+    IdAllocator,
+    MacPool,
+    int_to_ipv4,
+    ints_to_ipv4,
+    ints_to_mac,
+    ipv4_to_int,
+)
+import ipaddress
 import json
+import logging
 import os
-from inspect import getframeinfo, stack
-
+import sys
 
 STANDARD_IP_DOMAIN = "192.168"
+STANDARD_IP_NETWORK = f"{STANDARD_IP_DOMAIN}.0.0/16"
+# Locally administered OUI used for generated MAC addresses
+STANDARD_MAC_OUI = "02:00:00"
+# Range of generated grpc server ports of switches
+FIRST_SERVER_PORT = 50051
+LAST_SERVER_PORT = 65535
+# Suffix of the file next to a saved setup that holds the state of the id, port and
+# address generators
+BUILDER_STATE_SUFFIX = ".state.json"
+
+# Verbosity of builder diagnostics. All diagnostics are collected in
+# NetworkBuilder.diagnostics, these decide what else is done with them.
+DIAGNOSTICS_SILENT = 0  # Only collect
+DIAGNOSTICS_LOG = 1  # Also send to the logger of this module
+DIAGNOSTICS_PRINT = 2  # Also print with file and line of the caller
+
+logger = logging.getLogger(__name__)
+
+
+class Diagnostic(object):
+    """
+    A problem reported by the builder, e.g. a rejected node or link, with the
+    location in the user code that caused it
+    """
+
+    def __init__(self, message, filename, lineno, function, level=logging.WARNING):
+        self.message = message
+        self.filename = filename
+        self.lineno = lineno
+        self.function = function
+        self.level = level
+
+    def __str__(self):
+        return "%s:%d - %s" % (self.filename, self.lineno, self.message)
+
+    def __repr__(self):
+        return f"Diagnostic({str(self)!r})"
+
+
+class BatchResult(object):
+    """
+    Summary of a bulk add, see NetworkBuilder.add_nodes, add_switches and add_links
+    """
+
+    def __init__(self, kind) -> None:
+        self.kind = kind
+        self.added = 0
+        # (index of the item, reason) of every item that was not added
+        self.rejected = []
+        # (index of the item, message) of added items with problems, e.g. reused addresses
+        self.warnings = []
+
+    def __str__(self):
+        return (
+            f"Added {self.added} {self.kind}, rejected {len(self.rejected)}, "
+            f"{len(self.warnings)} warnings"
+        )
+
+    def __repr__(self):
+        return f"BatchResult({str(self)!r})"
+
+
+def _batch_args(item, names, defaults):
+    # Arguments of one bulk item as a tuple, from a tuple or a dict with the
+    # argument names. Leading None defaults are required arguments. Returns None if
+    # the item does not fit the arguments.
+    if isinstance(item, dict):
+        if not item.keys() <= set(names):
+            return None
+        return tuple(item.get(name, default) for name, default in zip(names, defaults))
+
+    item = tuple(item)
+    if len(item) == len(names):
+        return item
+    if len(item) > len(names) or len(item) < defaults.count(None):
+        return None
+    return item + defaults[len(item) :]
 
 
 class NetworkBuilder(object):
@@ -13,13 +101,32 @@ class NetworkBuilder(object):
     Class for creating network configuration for P4 benchexec. Holds all available functions.
     """
 
-    def __init__(self):
+    def __init__(
+        self,
+        ip_network=STANDARD_IP_NETWORK,
+        mac_oui=STANDARD_MAC_OUI,
+        verbosity=DIAGNOSTICS_PRINT,
+    ):
+        """
+        Args:
+            ip_network (str, optional): Network that node ipv4 addresses are assigned from when none is given. Defaults to 192.168.0.0/16.
+            mac_oui (str, optional): OUI of MAC addresses assigned to nodes without one. Defaults to 02:00:00.
+            verbosity (int, optional): DIAGNOSTICS_SILENT, DIAGNOSTICS_LOG or DIAGNOSTICS_PRINT. Defaults to DIAGNOSTICS_PRINT.
+        """
         self.network_setup = NetworkSetup()
         self.table_entries = []
-        self.ip_addresses = []
-        self.node_ids = []
+        # All used ipv4 addresses as ints, and pools to allocate new ones from
+        self.ip_addresses = set()
+        self.ip_pool = AddressPool(ip_network)
+        self.ip_pools = {str(self.ip_pool.network): self.ip_pool}
+        self.mac_pool = MacPool(mac_oui)
+        self.node_ids = IdAllocator(0)
+        self.server_ports = IdAllocator(FIRST_SERVER_PORT, LAST_SERVER_PORT)
         self.valid = False
         self.last_table_entry = None
+        self.verbosity = verbosity
+        # Diagnostic objects of all problems reported so far
+        self.diagnostics = []
 
     def add_new_node(self, name: str, ipv4_addr="", mac_addr="", node_id=""):
         """
@@ -27,21 +134,41 @@ class NetworkBuilder(object):
 
         Args:
             name (str): Name of the node. Should be unique.
-            ipv4_addr (str, optional): [ipv4-address of the node.]. Defaults to "".
-            mac_addr (str, optional): [mac address of the node]. Defaults to "".
+            ipv4_addr (str, optional): [ipv4-address of the node.]. If no address is given, a free one is assigned from the ip network of the builder.
+            mac_addr (str, optional): [mac address of the node]. If no address is given, a free one is generated.
             node_id (str, optional): [id of the node]. If no id is given a new on is auto generated
         """
-        if node_id == "":
+        id_generated = node_id == ""
+        if id_generated:
             node_id = self._generate_node_id()
 
         node = Node(name, ipv4_addr=ipv4_addr, mac_addr=mac_addr)
         node.id = node_id
 
-        self.node_ids.append(node_id)
-
-        if not node in self.network_setup.nodes:
+        # Keeps the generator from handing out ids that are given explicitly
+        id_reserved = self.node_ids.reserve(node_id) or id_generated
+
+        if not self.network_setup.has_node(node):
+            if not ipv4_addr:
+                try:
+                    node.ipv4_addr = self.ip_pool.allocate()
+                except ValueError as e:
+                    # Address pool exhausted, rejected like in add_nodes
+                    if id_reserved:
+                        self.node_ids.release(node_id)
+                    self._debug_info(f"{e}. Not adding Node {name} to setup")
+                    return
+                self.ip_addresses.add(ipv4_to_int(node.ipv4_addr))
+            elif not self._reserve_ip(ipv4_addr):
+                self._debug_info(f"Ipv4 address {ipv4_addr} is already used")
+            if not mac_addr:
+                node.mac_addr = self._generate_fresh_mac()
+            elif not self._reserve_mac(mac_addr):
+                self._debug_info(f"Mac address {mac_addr} is already used")
             self.network_setup.add_node(node)
         else:
+            if id_reserved:
+                self.node_ids.release(node_id)
             self._debug_info("Node with same id or name already exits")
 
     def add_new_switch(
@@ -58,16 +185,23 @@ class NetworkBuilder(object):
         """
         if server_port < 0:
             server_port = self._generate_switch_server_port()
+            port_reserved = True
+        else:
+            port_reserved = self.server_ports.reserve(server_port)
 
         if p4_info_path and not os.path.exists(p4_info_path):
+            if port_reserved:
+                self.server_ports.release(server_port)
             self._debug_info(f"Could not find p4 info file: {p4_info_path}")
             return
 
         switch = Switch(name, p4_file_name, p4_info_path, server_port)
 
-        if not switch in self.network_setup.switches:
+        if not self.network_setup.has_switch(switch):
             self.network_setup.add_switch(switch)
         else:
+            if port_reserved:
+                self.server_ports.release(server_port)
             self._debug_info("Switch with same id or name already exits")
 
     def add_table_entry_from_file(self, switch_name: str, path: str):
@@ -104,12 +238,12 @@ class NetworkBuilder(object):
             return
 
         # Check if desired port is used
-        if device1_port in dev1.used_ports:
+        if device1_port in dev1.ports:
             self._debug_info(
                 f"Failed to add link between {device1_name} and {device2_name} --> Port {device1_port} alread used in {device1_name}"
             )
             return
-        if device2_port in dev2.used_ports:
+        if device2_port in dev2.ports:
             self._debug_info(
                 f"Failed to add link between {device1_name} and {device2_name} --> Port {device2_port} alread used in {device2_name}"
             )
@@ -125,17 +259,18 @@ class NetworkBuilder(object):
             switch (Switch): Switch to add
         """
         switch_is_unique = True
-        for sw in self.network_setup.switches:
-            if switch.name == sw.name:
-                self._debug_info(f"Switch with name {switch.name} already exits")
-                switch_is_unique = False
-            if switch.server_port == sw.server_port:
-                self._debug_info(
-                    f"Swtich {switch.name} invalid server port. Port already used by Switch {sw.name}"
-                )
-                switch_is_unique = False
+        if self.network_setup.has_switch(switch):
+            self._debug_info(f"Switch with name {switch.name} already exits")
+            switch_is_unique = False
+        sw = self.network_setup.get_switch_by_server_port(switch.server_port)
+        if sw:
+            self._debug_info(
+                f"Swtich {switch.name} invalid server port. Port already used by Switch {sw.name}"
+            )
+            switch_is_unique = False
 
         if switch_is_unique:
+            self.server_ports.reserve(switch.server_port)
             self.network_setup.add_switch(switch)
         else:
             self._debug_info(f"Not adding Switch {switch.name} to setup")
@@ -148,33 +283,381 @@ class NetworkBuilder(object):
             node (Node): Node to add
         """
         node_is_unique = True
-        for n in self.network_setup.nodes:
-            if n == node:
-                self._debug_info(f"Node {node.name} already exits")
-                node_is_unique = False
+        if self.network_setup.has_node(node):
+            self._debug_info(f"Node {node.name} already exits")
+            node_is_unique = False
 
         if node_is_unique:
+            if node.ipv4_addr and not self._reserve_ip(node.ipv4_addr):
+                self._debug_info(f"Ipv4 address {node.ipv4_addr} is already used")
+            if node.mac_addr and not self._reserve_mac(node.mac_addr):
+                self._debug_info(f"Mac address {node.mac_addr} is already used")
+            self.node_ids.reserve(node.id)
             self.network_setup.add_node(node)
         else:
             self._debug_info(f"Not adding Node {node.name} to setup")
 
-    def save_setup_to_json(self, path: str):
+    def add_nodes(self, nodes):
+        """
+        Adds many nodes in one pass. Same rules as add_new_node, but nothing is printed
+        per node, see the returned summary instead. Ids, ipv4 and MAC addresses that
+        are not given are allocated in blocks after all given ones are reserved.
+
+        Args:
+            nodes (iterable): Tuples (name, ipv4_addr, mac_addr, node_id), where the
+                trailing values may be left out, or dicts with the same keys
+
+        Returns:
+            BatchResult: Number of added nodes and the rejected nodes with reasons
+        """
+        names = ("name", "ipv4_addr", "mac_addr", "node_id")
+        defaults = (None, "", "", "")
+        result = BatchResult("nodes")
+        setup = self.network_setup
+        nodes_by_name = setup._nodes_by_name
+        nodes_by_id = setup._nodes_by_id
+        node_ids = self.node_ids
+
+        # Names and ids of accepted nodes in this batch
+        new_names = set()
+        new_ids = set()
+        accepted = []
+        for index, item in enumerate(nodes):
+            if type(item) is tuple and 1 <= len(item) <= 4:
+                args = item + defaults[len(item) :]
+            else:
+                args = _batch_args(item, names, defaults)
+            if args is None or args[0] is None:
+                result.rejected.append((index, f"Invalid node arguments {item!r}"))
+                continue
+            name, ipv4_addr, mac_addr, node_id = args
+
+            if name in nodes_by_name or name in new_names:
+                result.rejected.append((index, f"Node {name} already exists"))
+                continue
+            if node_id != "":
+                if node_id in nodes_by_id or node_id in new_ids:
+                    result.rejected.append((index, f"Node id {node_id} already exists"))
+                    continue
+                node_ids.reserve(node_id)
+                new_ids.add(node_id)
+            new_names.add(name)
+
+            if ipv4_addr and not self._reserve_ip(ipv4_addr):
+                result.warnings.append(
+                    (index, f"Ipv4 address {ipv4_addr} is already used")
+                )
+            # Only a MAC reserved here is released if the node is rejected below
+            mac_reserved = False
+            if mac_addr:
+                mac_reserved = self._reserve_mac(mac_addr)
+                if not mac_reserved:
+                    result.warnings.append(
+                        (index, f"Mac address {mac_addr} is already used")
+                    )
+            accepted.append((index, name, ipv4_addr, mac_addr, node_id, mac_reserved))
+
+        # Nodes that do not fit in the ip network are rejected, the last ones first
+        ip_pool = self.ip_pool
+        nr_of_ips = sum(1 for node in accepted if not node[2])
+        free_ips = ip_pool.last - ip_pool.first + 1 - len(ip_pool)
+        if nr_of_ips > free_ips:
+            kept = []
+            for node in reversed(accepted):
+                if nr_of_ips > free_ips and not node[2]:
+                    nr_of_ips -= 1
+                    index, _, _, mac_addr, node_id, mac_reserved = node
+                    if node_id != "":
+                        node_ids.release(node_id)
+                    if mac_reserved:
+                        self._release_mac(mac_addr)
+                    result.rejected.append(
+                        (index, f"Address pool {ip_pool.network} is exhausted")
+                    )
+                else:
+                    kept.append(node)
+            kept.reverse()
+            accepted = kept
+            result.rejected.sort()
+
+        ips = ip_pool.allocate_ints(nr_of_ips)
+        self.ip_addresses.update(ips)
+        ips = iter(ints_to_ipv4(ips))
+        ids = iter(node_ids.allocate_ints(sum(1 for node in accepted if node[4] == "")))
+        macs = iter(
+            ints_to_mac(
+                self.mac_pool.allocate_ints(sum(1 for node in accepted if not node[3]))
+            )
+        )
+
+        add_node = setup.add_node
+        for _, name, ipv4_addr, mac_addr, node_id, _ in accepted:
+            add_node(
+                Node(
+                    name,
+                    ipv4_addr=ipv4_addr or next(ips),
+                    mac_addr=mac_addr or next(macs),
+                    node_id=next(ids) if node_id == "" else node_id,
+                )
+            )
+        result.added = len(accepted)
+
+        self._report_batch(result)
+        return result
+
+    def add_switches(self, switches):
+        """
+        Adds many switches in one pass. Same rules as add_new_switch, but every
+        distinct p4 info path is only checked once and switches reusing a server port
+        are rejected. Nothing is printed per switch, see the returned summary instead.
+
+        Args:
+            switches (iterable): Tuples (name, p4_file_name, p4_info_path, server_port),
+                where the trailing values may be left out, or dicts with the same keys
+
+        Returns:
+            BatchResult: Number of added switches and the rejected switches with reasons
+        """
+        names = ("name", "p4_file_name", "p4_info_path", "server_port")
+        defaults = (None, "", "", -1)
+        result = BatchResult("switches")
+        setup = self.network_setup
+        switches_by_name = setup._switches_by_name
+        switches_by_server_port = setup._switches_by_server_port
+        server_ports = self.server_ports
+        # p4 info path -> whether the file exists
+        p4_info_exists = {}
+
+        for index, item in enumerate(switches):
+            if type(item) is tuple and 1 <= len(item) <= 4:
+                args = item + defaults[len(item) :]
+            else:
+                args = _batch_args(item, names, defaults)
+            if args is None or args[0] is None:
+                result.rejected.append((index, f"Invalid switch arguments {item!r}"))
+                continue
+            name, p4_file_name, p4_info_path, server_port = args
+
+            if name in switches_by_name:
+                result.rejected.append((index, f"Switch {name} already exists"))
+                continue
+            if type(server_port) is not int:
+                result.rejected.append(
+                    (index, f"Invalid server port {server_port!r} of Switch {name}")
+                )
+                continue
+            # No path means no p4 info file, like in add_new_switch
+            if p4_info_path:
+                exists = p4_info_exists.get(p4_info_path)
+                if exists is None:
+                    exists = os.path.exists(p4_info_path)
+                    p4_info_exists[p4_info_path] = exists
+                if not exists:
+                    result.rejected.append(
+                        (index, f"Could not find p4 info file: {p4_info_path}")
+                    )
+                    continue
+            if server_port < 0:
+                server_port = server_ports.allocate()
+            elif server_port in switches_by_server_port:
+                result.rejected.append(
+                    (index, f"Server port {server_port} is already used")
+                )
+                continue
+            else:
+                server_ports.reserve(server_port)
+
+            setup.add_switch(Switch(name, p4_file_name, p4_info_path, server_port))
+            result.added += 1
+
+        self._report_batch(result)
+        return result
+
+    def add_links(self, links):
+        """
+        Adds many links in one pass. Same rules as add_new_link, ports that are not
+        given are set to an available port of the device. Nothing is printed per link,
+        see the returned summary instead.
+
+        Args:
+            links (iterable): Tuples (device1_name, device2_name, device1_port,
+                device2_port), where the ports may be left out, or dicts with the same keys
+
+        Returns:
+            BatchResult: Number of added links and the rejected links with reasons
+        """
+        names = ("device1_name", "device2_name", "device1_port", "device2_port")
+        defaults = (None, None, -1, -1)
+        result = BatchResult("links")
+        rejected = result.rejected
+        setup = self.network_setup
+        nodes_by_name = setup._nodes_by_name
+        switches_by_name = setup._switches_by_name
+        new_links = []
+
+        for index, item in enumerate(links):
+            if type(item) is tuple and 2 <= len(item) <= 4:
+                args = item + defaults[len(item) :]
+            else:
+                args = _batch_args(item, names, defaults)
+            if args is None or args[1] is None:
+                rejected.append((index, f"Invalid link arguments {item!r}"))
+                continue
+            name1, name2, port1, port2 = args
+            if type(port1) is not int or type(port2) is not int:
+                rejected.append(
+                    (index, f"Invalid ports {port1!r}, {port2!r} of link {item!r}")
+                )
+                continue
+
+            # Nodes take precedence, like in NetworkSetup.get_device
+            devices = nodes_by_name.get(name1)
+            if devices:
+                dev1_is_node = True
+            else:
+                devices = switches_by_name.get(name1)
+                if not devices:
+                    rejected.append((index, f"Device {name1} could not be found"))
+                    continue
+                dev1_is_node = False
+            dev1 = devices[0]
+            devices = nodes_by_name.get(name2)
+            if devices:
+                dev2_is_node = True
+            else:
+                devices = switches_by_name.get(name2)
+                if not devices:
+                    rejected.append((index, f"Device {name2} could not be found"))
+                    continue
+                dev2_is_node = False
+            dev2 = devices[0]
+
+            ports1 = dev1.ports
+            ports2 = dev2.ports
+            if port1 in ports1:
+                rejected.append((index, f"Port {port1} already used in {name1}"))
+                continue
+            if port2 in ports2 or (dev1 is dev2 and port1 == port2 and port1 >= 0):
+                rejected.append((index, f"Port {port2} already used in {name2}"))
+                continue
+
+            # Given ports first, so generated ones never take them
+            if port1 >= 0:
+                ports1.reserve(port1)
+            if port2 >= 0:
+                ports2.reserve(port2)
+            if port1 < 0:
+                port1 = ports1.allocate()
+            if port2 < 0:
+                port2 = ports2.allocate()
+
+            # Links with a node always have the node first
+            if dev1_is_node:
+                if dev2_is_node:
+                    link = Link(name1, name2, port1, port2, conn_type="Node_to_Node")
+                else:
+                    link = Link(name1, name2, port1, port2, conn_type="Node_to_Switch")
+            elif dev2_is_node:
+                link = Link(name2, name1, port2, port1, conn_type="Node_to_Switch")
+            else:
+                link = Link(name1, name2, port1, port2, conn_type="Switch_to_Switch")
+            new_links.append(link)
+
+        setup.add_links(new_links)
+        result.added = len(new_links)
+        self._report_batch(result)
+        return result
+
+    def add_routes(
+        self,
+        table_name=routing.DEFAULT_TABLE_NAME,
+        action_name=routing.DEFAULT_ACTION_NAME,
+        ecmp=True,
+        processes=None,
+        aggregate=False,
+    ):
+        """
+        Adds shortest path /32 routes to all hosts to the table entries of every switch.
+        See routing.compile_routes for the match field and param names.
+
+        Args:
+            table_name (str, optional): LPM table of the routes. Defaults to "Ingress.ipv4_lpm".
+            action_name (str, optional): Forwarding action with an egress_port param. Defaults to "Ingress.ipv4_forward".
+            ecmp (bool, optional): Spread hosts over equal cost next hops. Defaults to True.
+            processes (int, optional): Number of worker processes for large setups. Defaults to None.
+            aggregate (bool, optional): Merge routes with the same egress port into shorter prefixes, to fit the table size of the switches. Defaults to False.
+
+        Returns:
+            int: Number of added table entries
+        """
+        return routing.compile_routes(
+            self.network_setup,
+            table_name,
+            action_name,
+            ecmp=ecmp,
+            processes=processes,
+            aggregate=aggregate,
+        )
+
+    def allocate_ipv4_addresses(self, count: int, network=""):
+        """
+        Allocates unused ipv4 addresses in bulk, for example to assign to nodes created later.
+
+        Args:
+            count (int): Number of addresses
+            network (str, optional): Network in CIDR form, ex 10.0.0.0/12. Defaults to the ip network of the builder.
+
+        Returns:
+            list: The addresses as strings
+        """
+        pool = self._get_ip_pool(network)
+        addrs = pool.allocate_ints(count)
+        self.ip_addresses.update(addrs)
+        return ints_to_ipv4(addrs)
+
+    def allocate_mac_addresses(self, count: int):
+        """
+        Allocates unused MAC addresses in bulk, for example to assign to nodes created later.
+
+        Args:
+            count (int): Number of addresses
+
+        Returns:
+            list: The addresses as strings
+        """
+        return self.mac_pool.allocate_many(count)
+
+    def save_setup_to_json(
+        self, path: str, indent=4, compression=None, save_state=True
+    ):
         """Save the setup to json file. This is the file to be added as input to benchexec
 
+        The file is written incrementally, so large setups are never held in memory as
+        one big dict or string.
+
         Args:
             path (str): Path to where to save the file. Ex. /home/setup.json
+            indent (int, optional): Indentation of the json. None gives compact output. Defaults to 4.
+            compression (str, optional): None, "gzip" or "zstd". Defaults to None.
+            save_state (bool, optional): Also save the state of the id, port and address generators to path + ".state.json", which read_base_from_json picks up. Defaults to True.
         """
 
+        # Only checks what changed since the last check, see NetworkSetup.validate
+        result = self.validate()
         if not self.valid:
-            self.valid = not self.check_for_errors()
-
-        if not self.valid:
-            print("Setup isnt valid. Please fix errors before saving")
+            # The issues themselves are in the result of validate()
+            if self.verbosity == DIAGNOSTICS_PRINT:
+                result.print()
+            self._debug_info(
+                f"Setup isnt valid, {result} Please fix errors before saving"
+            )
             return
 
-        data = self.network_setup.to_dict()
-        with open(path, "w") as json_file:
-            json.dump(data, json_file, indent=4, sort_keys=True)
+        json_stream.save_setup(
+            self.network_setup, path, indent=indent, compression=compression
+        )
+        if save_state:
+            self._save_state(path + BUILDER_STATE_SUFFIX)
 
     def save_table_entries_to_json(self, path: str):
         """
@@ -183,14 +666,17 @@ class NetworkBuilder(object):
         Args:
             path (str): Path to file
         """
-        with open(path, "w") as json_file:
-            json.dump(self.table_entries, json_file, indent=4, sort_keys=True)
+        json_stream.save_table_entries(self.table_entries, path)
 
     def read_base_from_json(self, path: str):
         """
         Reads base setup from configuration file. Includes Nodes, Switches and Links.
         Will not include table entries.
 
+        If the builder is empty and the file was saved with its generator state, the
+        state is restored, so new ids, server ports and addresses continue where the
+        saving builder left off.
+
         Args:
             path: Absolute path to network configuration file
         """
@@ -199,14 +685,26 @@ class NetworkBuilder(object):
             self._debug_info(f"Failed to read {path}. Path not found")
             return
 
-        with open(path) as f:
-            data = json.load(f)
+        state_path = path + BUILDER_STATE_SUFFIX
+        if (
+            not self.network_setup.nodes
+            and not self.network_setup.switches
+            and os.path.exists(state_path)
+            and os.path.getmtime(state_path) >= os.path.getmtime(path)
+        ):
+            self._load_state(state_path)
+
+        # Table entries are skipped while parsing, they are never held in memory
+        data = json_stream.read_setup_base(path)
 
         # Add switches withoud table entries
         for switch_name in data["switches"]:
             switch_info = data["switches"][switch_name]
             self.add_new_switch(
-                switch_name, switch_info["p4_prog_name"], switch_info["p4_info_path"]
+                switch_name,
+                switch_info["p4_prog_name"],
+                switch_info["p4_info_path"],
+                switch_info.get("server_port", -1),
             )
 
         # Add nodes
@@ -243,10 +741,7 @@ class NetworkBuilder(object):
         given input is valid.
         """
 
-        switch = None
-        for sw in self.network_setup.switches:
-            if switch_name == sw.name:
-                switch = sw
+        switch = self.network_setup.get_switch(switch_name)
 
         if not switch:
             self._debug_info(f"Could not find switch {switch_name}")
@@ -276,13 +771,9 @@ class NetworkBuilder(object):
         The old dicts will be used, but all given keys will override the previous values.
         """
 
-        switch = None
-
         if not switch_name:
             switch_name = self.last_table_entry["switch_name"]
-        for sw in self.network_setup.switches:
-            if switch_name == sw.name:
-                switch = sw
+        switch = self.network_setup.get_switch(switch_name)
 
         if not switch:
             self._debug_info(f"Could not find switch {switch_name}")
@@ -292,7 +783,7 @@ class NetworkBuilder(object):
         self.last_table_entry["switch_name"] = switch_name
 
         if not self.last_table_entry:
-            print(f"No previous table entry was found")
+            self._debug_info("No previous table entry was found")
 
         if not table_name:
             table_name = self.last_table_entry["table_name"]
@@ -333,28 +824,56 @@ class NetworkBuilder(object):
         """
         switch = self._get_device(switch_name)
 
-        switch.p4_info_path = p4_info_path
-        switch.p4_prog_name = p4_prog_name
+        # Through the setup, so the next check looks at the switch again
+        self.network_setup.update_switch_p4_info(switch, p4_prog_name, p4_info_path)
 
     def add_table_entry_file_to_switch(self, switch_name: str, path: str):
         """
-        Adds a table entry defined in a file.
+        Adds a table entry defined in a file. The file can be a json array of table
+        entries or json lines with one table entry per line, optionally gzip or zstd
+        compressed. Entries are parsed and added one at a time, so files larger than
+        memory can be loaded.
         """
         if not os.path.exists(path):
-            print(f"Failed to add table entry file. File doest exist")
+            self._debug_info(
+                f"Failed to add table entry file. File doest exist: {path}"
+            )
             return
 
-        with open(path) as f:
-            data = json.load(f)
+        switch = self.network_setup.get_switch(switch_name)
+        if not switch:
+            self._debug_info(f"Could not find switch {switch_name}")
+            return
 
-            for table_entry in data:
-                self.add_table_entry_to_switch(
-                    switch_name,
-                    table_entry["table_name"],
-                    table_entry["action_name"],
-                    table_entry["match_fields"],
-                    table_entry["action_params"],
-                )
+        last_table_entry = switch.add_table_entries(
+            json_stream.iter_table_entries(path)
+        )
+        if last_table_entry:
+            self.last_table_entry = {
+                "switch_name": switch_name,
+                "table_name": last_table_entry["table_name"],
+                "action_name": last_table_entry["action_name"],
+                "match_fields": last_table_entry["match_fields"],
+                "action_params": last_table_entry["action_params"],
+            }
+
+    def clear_diagnostics(self):
+        """
+        Removes all collected diagnostics
+
+        Returns:
+            list: The removed Diagnostic objects, oldest first
+        """
+        diagnostics = self.diagnostics
+        self.diagnostics = []
+        return diagnostics
+
+    def print_diagnostics(self):
+        """
+        Prints all collected diagnostics, e.g. at the end of a silent bulk load
+        """
+        for diagnostic in self.diagnostics:
+            print(diagnostic)
 
     def print_setup(self):
         """
@@ -363,23 +882,48 @@ class NetworkBuilder(object):
         """
         print(self.network_setup)
 
-    def check_for_errors(self) -> bool:
+    def check_for_errors(self, processes=None, max_errors=None) -> bool:
         """
         Goes through all given input and check if its correct. Will give hints on how
         to fix any eventual errors
 
+        Args:
+            processes (int, optional): Number of worker processes for validating table entries. Defaults to None.
+            max_errors (int, optional): Stop checking after this many errors. Defaults to None.
+
         Returns:
             [bool]: True if setup has errors
         """
         print("######## Checking for errors #######")
-        return self.network_setup.check_for_errors()
+        result = self.validate(processes, max_errors)
+        result.print()
+        return result.has_errors
+
+    def validate(self, processes=None, max_errors=None):
+        """
+        Checks the setup like check_for_errors, but returns the issues instead of
+        printing them. Use result.to_json() or result.summary() for a machine
+        readable report.
+
+        Args:
+            processes (int, optional): Number of worker processes for validating table entries. Defaults to None.
+            max_errors (int, optional): Stop checking after this many errors. Defaults to None.
+
+        Returns:
+            ValidationResult: The issues found
+        """
+        result = self.network_setup.validate(processes, max_errors)
+        self.valid = not result.has_errors
+        return result
 
     # Private functions
+    def _report_batch(self, result):
+        # One diagnostic for the whole batch instead of one per rejected item
+        if result.rejected or result.warnings:
+            self._debug_info(str(result), stacklevel=3)
+
     def _get_device(self, device_name):
-        for dev in self.network_setup.nodes + self.network_setup.switches:
-            if dev.name == device_name:
-                return dev
-        return None
+        return self.network_setup.get_device(device_name)
 
     def _add_link_to_setup(self, dev1, dev2, device1_port, device2_port):
         if type(dev1) == Node:
@@ -411,17 +955,24 @@ class NetworkBuilder(object):
             node1_port (int, optional): Define port of the connection. If -1, autogenerate port. Defaults to -1.
             node2_port (int, optional): Define port of the connection. If -1, autogenerate port. Defaults to -1.
         """
+        node1 = self.network_setup.get_node(node1_name)
+        node2 = self.network_setup.get_node(node2_name)
+
+        # If no port is given, generate node ports
+        if node1_port < 0:
+            node1_port = node1.generate_port()
+        else:
+            node1.add_port(node1_port)
+        if node2_port < 0:
+            node2_port = node2.generate_port()
+        else:
+            node2.add_port(node2_port)
+
         link = Link(
             node1_name, node2_name, node1_port, node2_port, conn_type="Node_to_Node"
         )
 
-        if not link in self.network_setup.links:
-            self.network_setup.add_link(link)
-            for node in self.network_setup.nodes:
-                if node.name == node1_name:
-                    node.used_ports.append(node1_port)
-                elif node.name == node2_name:
-                    node.used_ports.append(node2_port)
+        self.network_setup.add_link(link)
 
     def _link_node_to_switch(
         self, node_name, switch_name, node_port=-1, switch_port=-1
@@ -435,37 +986,33 @@ class NetworkBuilder(object):
             node_port (int, optional): Define port of the connection. If -1, autogenerate port. Defaults to -1.
             switch_port (int, optional): Define port of the connection. If -1, autogenerate port. Defaults to -1.
         """
+        node = self.network_setup.get_node(node_name)
+        switch = self.network_setup.get_switch(switch_name)
+
         # If no port is given, generate port for node
         if node_port < 0:
-            for node in self.network_setup.nodes:
-                if node.name == node_name:
-                    node_port = node.generate_port()
+            node_port = node.generate_port()
         else:
-            for node in self.network_setup.nodes:
-                if node.name == node_name:
-                    if not node_port in node.used_ports:
-                        node.add_port(node_port)
-                    else:
-                        print(
-                            f"Failed to add link between {node_name} and {switch_name}"
-                        )
+            if not node_port in node.ports:
+                node.add_port(node_port)
+            else:
+                self._debug_info(
+                    f"Failed to add link between {node_name} and {switch_name}",
+                    # Reported at the add_new_link call
+                    stacklevel=4,
+                )
 
         # If no port is given, generate port for switch
         if switch_port < 0:
-            for switch in self.network_setup.switches:
-                if switch_name == switch.name:
-                    switch_port = switch.generate_port()
+            switch_port = switch.generate_port()
         else:
-            for switch in self.network_setup.switches:
-                if switch_name == switch.name:
-                    switch.add_port(switch_port)
+            switch.add_port(switch_port)
 
         link = Link(
             node_name, switch_name, node_port, switch_port, conn_type="Node_to_Switch"
         )
 
-        if not link in self.network_setup.links:
-            self.network_setup.add_link(link)
+        self.network_setup.add_link(link)
 
     def _link_switch_to_switch(
         self, switch1_name, switch2_name, switch1_port=-1, switch2_port=-1
@@ -479,23 +1026,18 @@ class NetworkBuilder(object):
             switch1_port (int, optional): Define port of the connection. If -1, autogenerate port. Defaults to -1.
             switch2_port (int, optional): Define port of the connection. If -1, autogenerate port. Defaults to -1.
         """
+        switch1 = self.network_setup.get_switch(switch1_name)
+        switch2 = self.network_setup.get_switch(switch2_name)
+
         # If no port is given, generate switch ports
         if switch1_port < 0:
-            for switch in self.network_setup.switches:
-                if switch1_name == switch.name:
-                    switch1_port = switch.generate_port()
+            switch1_port = switch1.generate_port()
         else:
-            for switch in self.network_setup.switches:
-                if switch1_name == switch.name:
-                    switch.add_port(switch1_port)
+            switch1.add_port(switch1_port)
         if switch2_port < 0:
-            for switch in self.network_setup.switches:
-                if switch2_name == switch.name:
-                    switch2_port = switch.generate_port()
+            switch2_port = switch2.generate_port()
         else:
-            for switch in self.network_setup.switches:
-                if switch2_name == switch.name:
-                    switch.add_port(switch2_port)
+            switch2.add_port(switch2_port)
 
         link = Link(
             switch1_name,
@@ -505,94 +1047,121 @@ class NetworkBuilder(object):
             conn_type="Switch_to_Switch",
         )
 
-        if not link in self.network_setup.links:
-            self.network_setup.links.append(link)
+        self.network_setup.add_link(link)
 
     def _generate_fresh_ip(self, domain_name=""):
         """Generates a unused ipv4 address in a specific domain. Define a domain name to generate an ip address in a specific domain. Ex 192.168.
 
         Args:
-            domain_name (str, optional): Define a domain name. Ex 172.1 will generate an ip address. Defaults to "".
+            domain_name (str, optional): Define a domain name. Ex 172.1 will generate an ip address in 172.1.0.0/16. Defaults to "".
 
         Returns:
             int[]: List if ints. Ex. [192, 168, 1, 1] for ip 192.168.1.1
         """
-        addres_array = domain_name.split(".")
-        addres_array_int = []
-
+        network = ""
         if domain_name != "":
-            for ele in addres_array:
-                addres_array_int.append(int(ele))
-
-        CIDR = len(addres_array_int)
-
-        if CIDR == 0:
-            if len(self.ip_addresses) == 0:
-                addres_array_int.append(172)
-                addres_array_int.append(168)
-                addres_array_int.append(1)
-                addres_array_int.append(1)
-            else:
-                for i in self.ip_addresses[-1]:
-                    addres_array_int.append(i)
-        else:
-            while len(addres_array_int) < 4:
-                addres_array_int.append(1)
-
-        # Check if ip address exits
-        while addres_array_int in self.ip_addresses:
-            if addres_array_int[3] < 255:
-                addres_array_int[3] += 1
-            else:
-                if addres_array_int[2] < 255:
-                    addres_array_int[2] += 1
-                    addres_array_int[3] = 1
-                else:
-                    if addres_array_int[1] < 255:
-                        addres_array_int[1] += 1
-                        addres_array_int[2] = 1
-                        addres_array_int[3] = 1
-                    else:
-                        if addres_array_int[0] < 255:
-                            addres_array_int[0] += 1
-                            addres_array_int[1] = 1
-                            addres_array_int[2] = 1
-                            addres_array_int[3] = 1
-
-        self.ip_addresses.append(addres_array_int)
-
-        return addres_array_int
+            octets = domain_name.strip(".").split(".")
+            network = ".".join(octets + ["0"] * (4 - len(octets)))
+            network += f"/{8 * len(octets)}"
+
+        addr = self._get_ip_pool(network).allocate_ints(1)[0]
+        self.ip_addresses.add(addr)
+
+        return [addr >> 24 & 0xFF, addr >> 16 & 0xFF, addr >> 8 & 0xFF, addr & 0xFF]
+
+    def _get_ip_pool(self, network):
+        if not network:
+            return self.ip_pool
+
+        network = str(ipaddress.IPv4Network(network, strict=False))
+        pool = self.ip_pools.get(network)
+        if pool is None:
+            pool = AddressPool(network)
+            # Addresses handed out before the pool existed
+            for addr in self.ip_addresses:
+                pool.reserve(addr)
+            self.ip_pools[network] = pool
+        return pool
+
+    def _reserve_ip(self, ipv4_addr):
+        # Returns False if the address is already used. Addresses that are not valid
+        # ipv4 addresses are left for check_for_errors.
+        try:
+            addr = ipv4_to_int(ipv4_addr)
+        except (OSError, TypeError):
+            return True
+        if addr in self.ip_addresses:
+            return False
+        self.ip_addresses.add(addr)
+        for pool in self.ip_pools.values():
+            pool.reserve(addr)
+        return True
+
+    def _generate_fresh_mac(self, setup=None):
+        """Generates an unused MAC address in the locally administered OUI of the builder
 
-    def _generate_fresh_mac(self, setup):
-        # TODO
-        nr_of_devices = len(setup.nodes) + len(setup.switches)
-
-        return
+        Returns:
+            str: MAC address. Ex 02:00:00:00:00:01
+        """
+        return self.mac_pool.allocate()
+
+    def _reserve_mac(self, mac_addr):
+        # Returns False if the address is already used. Addresses that are not valid
+        # MAC addresses are left for check_for_errors.
+        try:
+            return self.mac_pool.reserve(mac_addr)
+        except ValueError:
+            return True
+
+    def _release_mac(self, mac_addr):
+        try:
+            self.mac_pool.release(mac_addr)
+        except ValueError:
+            pass
 
     def _generate_node_id(self):
-        id = 0
-        while id in self.node_ids:
-            id += 1
-
-        return id
+        return self.node_ids.allocate()
 
     def _generate_switch_server_port(self):
-        server_port = 50051
-        switch_ports = []
-
-        for switches in self.network_setup.switches:
-            switch_ports.append(switches.server_port)
-
-        while server_port in switch_ports:
-            server_port += 1
-
-        return server_port
+        return self.server_ports.allocate()
+
+    def _save_state(self, path):
+        state = {
+            "node_ids": self.node_ids.to_dict(),
+            "server_ports": self.server_ports.to_dict(),
+            "ip_pools": {
+                network: pool.to_dict() for network, pool in self.ip_pools.items()
+            },
+            "mac_pool": self.mac_pool.to_dict(),
+        }
+        with open(path, "w") as f:
+            json.dump(state, f, indent=4, sort_keys=True)
+
+    def _load_state(self, path):
+        with open(path, "r") as f:
+            state = json.load(f)
+
+        self.node_ids.load_dict(state["node_ids"])
+        self.server_ports.load_dict(state["server_ports"])
+        for network, pool_state in state["ip_pools"].items():
+            self._get_ip_pool(network).load_dict(pool_state)
+        if state["mac_pool"]["oui"] == self.mac_pool.oui:
+            self.mac_pool.load_dict(state["mac_pool"])
+
+    def _debug_info(self, message, level=logging.WARNING, stacklevel=2):
+        # Only the frame of the code calling the builder is looked up, no source
+        # lines are read
+        frame = sys._getframe(stacklevel)
+        code = frame.f_code
+        diagnostic = Diagnostic(
+            message, code.co_filename, frame.f_lineno, code.co_name, level
+        )
+        self.diagnostics.append(diagnostic)
 
-    def _debug_info(self, message):
-        caller = getframeinfo(stack()[2][0])
-        print(
-            "%s:%d - %s" % (caller.filename, caller.lineno, message)
-        )  # python3 syntax print
+        if self.verbosity == DIAGNOSTICS_PRINT:
+            print(diagnostic)
+        elif self.verbosity == DIAGNOSTICS_LOG:
+            logger.log(level, "%s", diagnostic)
 
     # Functions for creating table entry file
     def add_table_entry_to_file(
@@ -0,0 +1,270 @@
+from p4.v1 import p4runtime_pb2
+from p4.config.v1 import p4info_pb2
+
+from .convert import encode, encodeIPv4
+from .p4_helper import get_p4info_helper
+
+# Max number of pre-encoded values kept per action param
+PARAM_CACHE_SIZE = 4096
+
+
+class _FieldLayout(object):
+    def __init__(self, id, bitwidth, match_type=None) -> None:
+        self.id = id
+        self.bitwidth = bitwidth
+        self.match_type = match_type
+
+
+class _TableLayout(object):
+    def __init__(self, id, name, match_fields) -> None:
+        self.id = id
+        self.name = name
+        self.match_fields = match_fields
+
+
+class _ActionLayout(object):
+    def __init__(self, id, params) -> None:
+        self.id = id
+        self.params = params
+        # param name -> {value: encoded Param message}
+        self.param_cache = {name: {} for name in params}
+
+
+class TableEntryCompiler(object):
+    """
+    Compiles table entries on the json format used by the setup files
+    ({"table_name", "action_name", "match_fields", "action_params"}) into P4Runtime
+    TableEntry messages. Table and action layouts are looked up once per name, and
+    encoded action params are reused for repeated values.
+    """
+
+    def __init__(self, helper) -> None:
+        self.helper = helper
+        self._tables = {}
+        self._actions = {}
+
+    def compile(self, table_entry):
+        """
+        Compiles one table entry
+
+        Args:
+            table_entry (dict): Table entry on json format
+
+        Returns:
+            TableEntry: P4Runtime table entry
+        """
+        pb_entry = p4runtime_pb2.TableEntry()
+        self._fill_entry(pb_entry, table_entry)
+        return pb_entry
+
+    def compile_all(self, table_entries):
+        """
+        Compiles a list of table entries
+
+        Args:
+            table_entries (list): Table entries on json format
+
+        Returns:
+            list: P4Runtime table entries, in the same order
+        """
+        compile = self.compile
+        return [compile(table_entry) for table_entry in table_entries]
+
+    def build_write_request(
+        self,
+        table_entries,
+        device_id=0,
+        election_id=(0, 1),
+        update_type=p4runtime_pb2.Update.INSERT,
+    ):
+        """
+        Compiles a list of table entries into a single WriteRequest
+
+        Args:
+            table_entries (list): Table entries on json format
+            device_id (int, optional): P4Runtime device id. Defaults to 0.
+            election_id (tuple, optional): (high, low) election id. Defaults to (0, 1).
+            update_type (int, optional): Update type of all updates. Defaults to INSERT.
+
+        Returns:
+            WriteRequest: Request holding one update per table entry
+        """
+        request = p4runtime_pb2.WriteRequest(device_id=device_id)
+        request.election_id.high = election_id[0]
+        request.election_id.low = election_id[1]
+
+        updates = request.updates
+        for table_entry in table_entries:
+            update = updates.add()
+            update.type = update_type
+            self._fill_entry(update.entity.table_entry, table_entry)
+
+        return request
+
+    # Private functions
+    def _fill_entry(self, pb_entry, table_entry):
+        table = self._get_table_layout(table_entry["table_name"])
+
+        pb_entry.table_id = table.id
+
+        priority = table_entry.get("priority")
+        if priority is not None:
+            pb_entry.priority = priority
+
+        match_fields = table_entry["match_fields"]
+        if match_fields:
+            pb_entry.match.extend(
+                [
+                    self._build_match(table, name, value)
+                    for name, value in match_fields.items()
+                ]
+            )
+
+        if table_entry.get("default_action"):
+            pb_entry.is_default_action = True
+
+        action_name = table_entry["action_name"]
+        if action_name:
+            layout = self._get_action_layout(action_name)
+            action = pb_entry.action.action
+            action.action_id = layout.id
+            action_params = table_entry["action_params"]
+            if action_params:
+                action.params.extend(
+                    [
+                        self._build_param(layout, action_name, name, value)
+                        for name, value in action_params.items()
+                    ]
+                )
+
+    def _get_table_layout(self, table_name):
+        table = self._tables.get(table_name)
+        if table is None:
+            p4info_table = self.helper.get("tables", name=table_name)
+            match_fields = {
+                mf.name: _FieldLayout(mf.id, mf.bitwidth, mf.match_type)
+                for mf in reversed(p4info_table.match_fields)
+            }
+            table = _TableLayout(
+                p4info_table.preamble.id, p4info_table.preamble.name, match_fields
+            )
+            self._tables[table_name] = table
+        return table
+
+    def _get_action_layout(self, action_name):
+        action = self._actions.get(action_name)
+        if action is None:
+            p4info_action = self.helper.get("actions", name=action_name)
+            params = {
+                p.name: _FieldLayout(p.id, p.bitwidth)
+                for p in reversed(p4info_action.params)
+            }
+            action = _ActionLayout(p4info_action.preamble.id, params)
+            self._actions[action_name] = action
+        return action
+
+    def _build_match(self, table, name, value):
+        field = table.match_fields.get(name)
+        if field is None:
+            raise AttributeError("%r has no attribute %r" % (table.name, name))
+
+        match_type = field.match_type
+        bitwidth = field.bitwidth
+        if match_type == p4info_pb2.MatchField.EXACT:
+            return p4runtime_pb2.FieldMatch(
+                field_id=field.id,
+                exact=p4runtime_pb2.FieldMatch.Exact(value=encode(value, bitwidth)),
+            )
+        elif match_type == p4info_pb2.MatchField.LPM:
+            address = value[0]
+            encoded = None
+            # Shortcut for the common IPv4 route case, skips type inference
+            if bitwidth == 32 and type(address) == str:
+                try:
+                    encoded = encodeIPv4(address)
+                except OSError:
+                    pass
+            if encoded is None:
+                encoded = encode(address, bitwidth)
+            return p4runtime_pb2.FieldMatch(
+                field_id=field.id,
+                lpm=p4runtime_pb2.FieldMatch.LPM(value=encoded, prefix_len=value[1]),
+            )
+        elif match_type == p4info_pb2.MatchField.TERNARY:
+            return p4runtime_pb2.FieldMatch(
+                field_id=field.id,
+                ternary=p4runtime_pb2.FieldMatch.Ternary(
+                    value=encode(value[0], bitwidth), mask=encode(value[1], bitwidth)
+                ),
+            )
+        elif match_type == p4info_pb2.MatchField.RANGE:
+            return p4runtime_pb2.FieldMatch(
+                field_id=field.id,
+                range=p4runtime_pb2.FieldMatch.Range(
+                    low=encode(value[0], bitwidth), high=encode(value[1], bitwidth)
+                ),
+            )
+        elif match_type == p4info_pb2.MatchField.OPTIONAL:
+            return p4runtime_pb2.FieldMatch(
+                field_id=field.id,
+                optional=p4runtime_pb2.FieldMatch.Optional(
+                    value=encode(value, bitwidth)
+                ),
+            )
+        else:
+            raise Exception("Unsupported match type with type %r" % match_type)
+
+    def _build_param(self, action, action_name, name, value):
+        param = action.params.get(name)
+        if param is None:
+            raise AttributeError(
+                "action %r has no param %r, (has: %r)"
+                % (action_name, name, list(action.params))
+            )
+
+        cache = action.param_cache[name]
+        key = (type(value), value) if type(value) in (int, str) else None
+        if key is not None:
+            pb_param = cache.get(key)
+            if pb_param is not None:
+                return pb_param
+
+        pb_param = p4runtime_pb2.Action.Param(
+            param_id=param.id, value=encode(value, param.bitwidth)
+        )
+        if key is not None and len(cache) < PARAM_CACHE_SIZE:
+            cache[key] = pb_param
+        return pb_param
+
+
+def compile_table_entries(p4_info_path, table_entries):
+    """
+    Compiles table entries into P4Runtime TableEntry messages
+
+    Args:
+        p4_info_path (str): Path to p4 info file of the program
+        table_entries (list): Table entries on json format
+
+    Returns:
+        list: P4Runtime table entries
+    """
+    helper = get_p4info_helper(p4_info_path)
+    return TableEntryCompiler(helper).compile_all(table_entries)
+
+
+def compile_switch_entries(switch, device_id=0, election_id=(0, 1)):
+    """
+    Compiles all table entries of a switch into a single WriteRequest
+
+    Args:
+        switch (Switch): Switch with p4 info path and table entries
+        device_id (int, optional): P4Runtime device id. Defaults to 0.
+        election_id (tuple, optional): (high, low) election id. Defaults to (0, 1).
+
+    Returns:
+        WriteRequest: Request inserting all table entries of the switch
+    """
+    helper = get_p4info_helper(switch.p4_info_path)
+    return TableEntryCompiler(helper).build_write_request(
+        switch.table_entries, device_id, election_id
+    )
@@ -12,19 +12,29 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 #
+import functools
 import re
 import socket
 
 import math
 
+try:
+    import numpy as np
+except ImportError:  # numpy is only needed for the array fast paths
+    np = None
+
 """
 This package contains several helper functions for encoding to and decoding from byte strings:
 - integers
 - IPv4 address strings
 - Ethernet address strings
+
+The *Batch functions encode whole sequences (or NumPy arrays) of values into one packed
+buffer, with every value taking the same number of bytes. Use splitEncoded to get the
+individual values back out of such a buffer.
 """
 
-mac_pattern = re.compile("^([\da-fA-F]{2}:){5}([\da-fA-F]{2})$")
+mac_pattern = re.compile(r"^([\da-fA-F]{2}:){5}([\da-fA-F]{2})$")
 
 
 def matchesMac(mac_addr_string):
@@ -32,14 +42,14 @@ def matchesMac(mac_addr_string):
 
 
 def encodeMac(mac_addr_string):
-    return mac_addr_string.replace(":", "").decode("hex")
+    return bytes.fromhex(mac_addr_string.replace(":", ""))
 
 
 def decodeMac(encoded_mac_addr):
-    return ":".join(s.encode("hex") for s in encoded_mac_addr)
+    return ":".join("%02x" % b for b in encoded_mac_addr)
 
 
-ip_pattern = re.compile("^(\d{1,3}\.){3}(\d{1,3})$")
+ip_pattern = re.compile(r"^(\d{1,3}\.){3}(\d{1,3})$")
 
 
 def matchesIPv4(ip_addr_string):
@@ -47,11 +57,11 @@ def matchesIPv4(ip_addr_string):
 
 
 def encodeIPv4(ip_addr_string):
-    return socket.inet_aton(ip_addr_string)
+    return socket.inet_pton(socket.AF_INET, ip_addr_string)
 
 
 def decodeIPv4(encoded_ip_addr):
-    return socket.inet_ntoa(encoded_ip_addr)
+    return socket.inet_ntop(socket.AF_INET, encoded_ip_addr)
 
 
 def bitwidthToBytes(bitwidth):
@@ -60,14 +70,13 @@ def bitwidthToBytes(bitwidth):
 
 def encodeNum(number, bitwidth):
     byte_len = bitwidthToBytes(bitwidth)
-    num_str = "%x" % number
-    if number >= 2 ** bitwidth:
+    if number >= 2**bitwidth:
         raise Exception("Number, %d, does not fit in %d bits" % (number, bitwidth))
-    return ("0" * (byte_len * 2 - len(num_str)) + num_str).decode("hex")
+    return number.to_bytes(byte_len, "big")
 
 
 def decodeNum(encoded_number):
-    return int(encoded_number.encode("hex"), 16)
+    return int.from_bytes(encoded_number, "big")
 
 
 def encode(x, bitwidth):
@@ -83,7 +92,9 @@ def encode(x, bitwidth):
             encoded_bytes = encodeIPv4(x)
         else:
             # Assume that the string is already encoded
-            encoded_bytes = x
+            encoded_bytes = x.encode("latin-1")
+    elif type(x) == bytes:
+        encoded_bytes = x
     elif type(x) == int:
         encoded_bytes = encodeNum(x, bitwidth)
     else:
@@ -92,24 +103,109 @@ def encode(x, bitwidth):
     return encoded_bytes
 
 
+def _is_array(values):
+    return np is not None and isinstance(values, np.ndarray)
+
+
+def _pack_uint_array(values, byte_len, bitwidth):
+    # Packs an integer array into big endian values of byte_len bytes each
+    values = np.asarray(values)
+    if values.size and (values.min() < 0 or int(values.max()) >= 2**bitwidth):
+        raise Exception("Numbers do not fit in %d bits" % bitwidth)
+    if byte_len > 8:
+        return encodeNumBatch([int(v) for v in values.ravel()], bitwidth)
+    packed = values.astype(">u8").reshape(-1, 1).view(np.uint8)
+    return packed[:, 8 - byte_len :].tobytes()
+
+
+def encodeNumBatch(numbers, bitwidth):
+    """
+    Encodes a sequence or NumPy array of non negative integers. Each number takes
+    bitwidthToBytes(bitwidth) bytes in the returned buffer.
+    """
+    byte_len = bitwidthToBytes(bitwidth)
+    if _is_array(numbers):
+        return _pack_uint_array(numbers, byte_len, bitwidth)
+
+    numbers = list(numbers)
+    if numbers and (min(numbers) < 0 or max(numbers) >= 2**bitwidth):
+        raise Exception("Numbers do not fit in %d bits" % bitwidth)
+    to_bytes = int.to_bytes
+    return b"".join([to_bytes(n, byte_len, "big") for n in numbers])
+
+
+def encodeIPv4Batch(ip_addrs):
+    """
+    Encodes a sequence of IPv4 address strings, or a NumPy array of addresses as
+    32 bit integers, into a buffer with 4 bytes per address.
+    """
+    if _is_array(ip_addrs):
+        return _pack_uint_array(ip_addrs, 4, 32)
+
+    inet_pton = functools.partial(socket.inet_pton, socket.AF_INET)
+    return b"".join(map(inet_pton, ip_addrs))
+
+
+def encodeMacBatch(mac_addrs):
+    """
+    Encodes a sequence of MAC address strings, or a NumPy array of addresses as
+    48 bit integers, into a buffer with 6 bytes per address.
+    """
+    if _is_array(mac_addrs):
+        return _pack_uint_array(mac_addrs, 6, 48)
+
+    # Every address is encoded on its own like encodeMac, so a bad address can not
+    # be hidden by its neighbours in the joined hex
+    fromhex = bytes.fromhex
+    encoded = [fromhex(mac_addr.replace(":", "")) for mac_addr in mac_addrs]
+    if any(len(mac) != 6 for mac in encoded):
+        raise Exception("Invalid MAC address in batch")
+    return b"".join(encoded)
+
+
+def splitEncoded(encoded, bitwidth):
+    """
+    Splits a buffer from one of the *Batch functions into one bytes object per value
+    """
+    byte_len = bitwidthToBytes(bitwidth)
+    return [encoded[i : i + byte_len] for i in range(0, len(encoded), byte_len)]
+
+
+def decodeIPv4Batch(encoded):
+    """
+    Decodes a buffer with 4 bytes per address into IPv4 address strings
+    """
+    inet_ntop = socket.inet_ntop
+    af_inet = socket.AF_INET
+    return [inet_ntop(af_inet, encoded[i : i + 4]) for i in range(0, len(encoded), 4)]
+
+
+def decodeNumBatch(encoded, bitwidth):
+    """
+    Decodes a buffer from encodeNumBatch back into a list of integers
+    """
+    from_bytes = int.from_bytes
+    return [from_bytes(b, "big") for b in splitEncoded(encoded, bitwidth)]
+
+
 if __name__ == "__main__":
     # TODO These tests should be moved out of main eventually
     mac = "aa:bb:cc:dd:ee:ff"
     enc_mac = encodeMac(mac)
-    assert enc_mac == "\xaa\xbb\xcc\xdd\xee\xff"
+    assert enc_mac == b"\xaa\xbb\xcc\xdd\xee\xff"
     dec_mac = decodeMac(enc_mac)
     assert mac == dec_mac
 
     ip = "10.0.0.1"
     enc_ip = encodeIPv4(ip)
-    assert enc_ip == "\x0a\x00\x00\x01"
+    assert enc_ip == b"\x0a\x00\x00\x01"
     dec_ip = decodeIPv4(enc_ip)
     assert ip == dec_ip
 
     num = 1337
     byte_len = 5
     enc_num = encodeNum(num, byte_len * 8)
-    assert enc_num == "\x00\x00\x00\x05\x39"
+    assert enc_num == b"\x00\x00\x00\x05\x39"
     dec_num = decodeNum(enc_num)
     assert num == dec_num
 
@@ -124,6 +220,18 @@ if __name__ == "__main__":
     assert encode((num,), 5 * 8) == enc_num
     assert encode([num], 5 * 8) == enc_num
 
+    assert encodeMacBatch([mac, mac]) == enc_mac * 2
+    assert encodeIPv4Batch([ip, ip]) == enc_ip * 2
+    assert encodeNumBatch([num, num], byte_len * 8) == enc_num * 2
+    assert splitEncoded(enc_num * 2, byte_len * 8) == [enc_num, enc_num]
+    assert decodeIPv4Batch(enc_ip * 2) == [ip, ip]
+    assert decodeNumBatch(enc_num * 2, byte_len * 8) == [num, num]
+
+    if np is not None:
+        assert encodeIPv4Batch(np.array([0x0A000001] * 2)) == enc_ip * 2
+        assert encodeMacBatch(np.array([0xAABBCCDDEEFF] * 2)) == enc_mac * 2
+        assert encodeNumBatch(np.array([num] * 2), byte_len * 8) == enc_num * 2
+
     num = 256
     byte_len = 2
     try:
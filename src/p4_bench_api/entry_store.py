@@ -0,0 +1,650 @@
+"""
+Compact storage of the table entries of a switch.
+
+A table entry on json format is a dict with four keys and nested match field and
+action param dicts, which is around a kilobyte of Python objects. TableEntryStore
+keeps entries with the same table, action, field names and value types together in
+a group, and stores the values of each field in a typed array:
+
+    ints                        array("q")
+    ipv4 addresses, "10.0.0.1"  array("I")
+    MAC addresses               array("Q")
+    other strings               ids into a table of interned strings, array("I")
+    [value, value] pairs        one column per element, e.g. LPM [addr, prefix_len]
+
+Names are kept once per group, so a typical LPM route takes about 30 bytes. Entries
+that do not fit, e.g. with extra keys or nested values, are stored as they are.
+
+The store is a sequence of table entry dicts, in the order they were added. The
+dicts are created when accessed, so changing them does not change the store.
+"""
+
+import json
+import socket
+import struct
+from array import array
+from collections import Counter
+from collections.abc import MutableSequence
+from functools import lru_cache
+from itertools import repeat
+
+from .allocators import int_to_mac, mac_to_int
+
+try:
+    import numpy as np
+except ImportError:  # numpy is only needed for the fast paths of column_groups
+    np = None
+
+ENTRY_KEYS = ("table_name", "action_name", "match_fields", "action_params")
+
+_INT_MIN = -(1 << 63)
+_INT_MAX = (1 << 63) - 1
+
+_pack_ipv4 = struct.Struct("!I").pack
+_unpack_ipv4 = struct.Struct("!I").unpack
+
+
+def _ipv4_to_int(value):
+    return _unpack_ipv4(socket.inet_aton(value))[0]
+
+
+def _int_to_ipv4(value):
+    return socket.inet_ntoa(_pack_ipv4(value))
+
+
+def _int_to_json(value):
+    return str(value)
+
+
+def _ipv4_to_json(value):
+    return '"' + socket.inet_ntoa(_pack_ipv4(value)) + '"'
+
+
+def _mac_to_json(value):
+    return '"' + int_to_mac(value) + '"'
+
+
+class TableEntryStore(MutableSequence):
+    """
+    Sequence of table entries stored in typed columns, see the module docstring.
+    Appending and iterating are the fast operations. Inserting, replacing or
+    deleting entries rebuilds the store.
+    """
+
+    def __init__(self, table_entries=()) -> None:
+        # Incremented whenever entries are replaced or removed, appending entries
+        # keeps it. Lets validation skip entries it has already checked.
+        self.version = 0
+        self._groups = []
+        # Signature of an entry -> its group
+        self._group_index = {}
+        # Group and row in the group of every entry, in order
+        self._entry_group = array("I")
+        self._entry_row = array("I")
+        # Interned strings for string columns
+        self._strings = []
+        self._string_ids = {}
+        # Entry indices sorted by group and where each group starts, for the number
+        # of entries and version they were made for, see _group_entry_indices
+        self._group_order = None
+        self.extend(table_entries)
+
+    def __len__(self):
+        return len(self._entry_group)
+
+    def __iter__(self):
+        groups = self._groups
+        for group, row in zip(self._entry_group, self._entry_row):
+            yield groups[group].entry(row)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self[i] for i in range(*index.indices(len(self)))]
+        if index < 0:
+            index += len(self)
+        return self._groups[self._entry_group[index]].entry(self._entry_row[index])
+
+    def __setitem__(self, index, value):
+        table_entries = list(self)
+        table_entries[index] = value
+        self._rebuild(table_entries)
+
+    def __delitem__(self, index):
+        table_entries = list(self)
+        del table_entries[index]
+        self._rebuild(table_entries)
+
+    def __eq__(self, other):
+        if isinstance(other, (TableEntryStore, list)):
+            return len(self) == len(other) and all(a == b for a, b in zip(self, other))
+        return NotImplemented
+
+    def __repr__(self):
+        return f"TableEntryStore({len(self)} entries in {len(self._groups)} groups)"
+
+    def insert(self, index, value):
+        if index >= len(self):
+            self.append(value)
+            return
+        table_entries = list(self)
+        table_entries.insert(index, value)
+        self._rebuild(table_entries)
+
+    def clear(self):
+        self._rebuild(())
+
+    def append(self, table_entry):
+        """
+        Adds a table entry. Dicts with the four table entry keys in the usual order
+        are stored in columns, anything else as it is.
+        """
+        if type(table_entry) is dict and tuple(table_entry) == ENTRY_KEYS:
+            self.add(
+                table_entry["table_name"],
+                table_entry["action_name"],
+                table_entry["match_fields"],
+                table_entry["action_params"],
+            )
+        else:
+            self._add_to_group(_GENERIC_SIGNATURE, table_entry)
+
+    def extend(self, table_entries):
+        append = self.append
+        for table_entry in table_entries:
+            append(table_entry)
+
+    def add(self, table_name, action_name, match_fields, action_params):
+        """
+        Adds a table entry without creating a dict for it first
+        """
+        leaves = []
+        signature = _signature(
+            table_name, action_name, match_fields, action_params, leaves
+        )
+        if signature is None:
+            self._add_to_group(
+                _GENERIC_SIGNATURE,
+                {
+                    "table_name": table_name,
+                    "action_name": action_name,
+                    "match_fields": match_fields,
+                    "action_params": action_params,
+                },
+            )
+            return
+
+        group = self._group_index.get(signature)
+        if group is None:
+            group = self._new_group(signature)
+        self._entry_group.append(group.index)
+        self._entry_row.append(group.count)
+        group.add_leaves(leaves)
+
+    def add_columns(
+        self, table_name, action_name, match_fields, action_params, columns
+    ):
+        """
+        Adds entries that only differ in their values, much faster than calling add
+        for each of them. match_fields and action_params give the names and kind of
+        values of the entries, e.g. they can be the first entry. The values are given
+        per match field and param in the same order, pairs taking two columns.
+        Addresses can be given as ints.
+
+        Example:
+            store.add_columns(
+                "Ingress.ipv4_lpm",
+                "Ingress.ipv4_forward",
+                {"hdr.ipv4.dst_addr": ["10.0.0.1", 32]},
+                {"egress_port": 1},
+                [["10.0.0.1", "10.0.0.2"], [32, 32], [1, 2]],
+            )
+
+        Args:
+            table_name (str): Name of the table
+            action_name (str): Name of the action
+            match_fields (dict): Match fields of an example entry
+            action_params (dict): Action params of an example entry
+            columns (list): One sequence of values per match field and param value
+        """
+        signature = _signature(table_name, action_name, match_fields, action_params, [])
+        if signature is None:
+            raise ValueError(f"Entries of {table_name} can not be stored in columns")
+        group = self._group_index.get(signature)
+        if group is None:
+            group = self._new_group(signature)
+        if len(columns) != len(group.columns):
+            raise ValueError(
+                f"Expected {len(group.columns)} columns, got {len(columns)}"
+            )
+        count = len(columns[0]) if columns else 0
+        if any(len(column) != count for column in columns):
+            raise ValueError("All columns must have the same length")
+
+        for codec, column, values in zip(group.leaf_codecs, group.columns, columns):
+            if codec == "s":
+                values = [self._intern(value) for value in values]
+            elif codec != "i":
+                values = [_column_value(codec, value) for value in values]
+            column.extend(values)
+        self._entry_group.extend(repeat(group.index, count))
+        self._entry_row.extend(range(group.count, group.count + count))
+        group.count += count
+
+    def groups(self):
+        """
+        Returns:
+            list: (table_name, action_name, number of entries) of every group of columns
+        """
+        return [
+            (group.table_name, group.action_name, group.count)
+            for group in self._groups
+            if not group.generic
+        ]
+
+    def table_counts(self):
+        """
+        Counts the entries of every table from the group sizes
+
+        Returns:
+            Counter: Table name -> number of entries. Entries without a string
+                table name are not counted.
+        """
+        counts = Counter()
+        for group in self._groups:
+            if not group.generic:
+                counts[group.table_name] += group.count
+                continue
+            for table_entry in group.objects:
+                if isinstance(table_entry, dict):
+                    table_name = table_entry.get("table_name")
+                    if type(table_name) is str:
+                        counts[table_name] += 1
+        return counts
+
+    def iter_json_items(self, encode_item):
+        """
+        Yields every entry encoded as json, without creating the entry dicts. Each
+        group is encoded once with placeholder values by encode_item, and the values
+        of every row are filled into that template.
+
+        Args:
+            encode_item (function): Encodes an entry dict as it appears in a json list
+        """
+        formatters = [group.json_formatter(encode_item) for group in self._groups]
+        for group, row in zip(self._entry_group, self._entry_row):
+            yield formatters[group](row)
+
+    def column_groups(self, start=0, stop=None):
+        """
+        The entries in range(start, stop) by group, for checking the values of many
+        entries at once without creating the entry dicts
+
+        Returns:
+            list: EntryColumns of every group with entries in the range
+        """
+        count = len(self)
+        start, stop, _ = slice(start, stop).indices(count)
+        if start >= stop:
+            return []
+        if start == 0 and stop == count:
+            ranges = [(0, group.count) for group in self._groups]
+        else:
+            # Rows of a group are in entry order, so the range is a run of rows
+            in_range = _count_groups(self._entry_group[start:stop], len(self._groups))
+            after = _count_groups(self._entry_group[stop:], len(self._groups))
+            ranges = []
+            for group, group_count, group_after in zip(self._groups, in_range, after):
+                stop_row = group.count - group_after
+                ranges.append((stop_row - group_count, stop_row))
+
+        return [
+            EntryColumns(self, group, start_row, stop_row)
+            for group, (start_row, stop_row) in zip(self._groups, ranges)
+            if start_row < stop_row
+        ]
+
+    # Private functions
+    def _group_entry_indices(self, group_index):
+        # Index of every entry of a group, in row order
+        if np is None:
+            return [
+                index
+                for index, group in enumerate(self._entry_group)
+                if group == group_index
+            ]
+
+        key = (len(self), self.version)
+        if self._group_order is None or self._group_order[0] != key:
+            groups = np.frombuffer(
+                self._entry_group, dtype=f"u{self._entry_group.itemsize}"
+            )
+            order = np.argsort(groups, kind="stable")
+            starts = np.zeros(len(self._groups) + 1, dtype=np.int64)
+            np.cumsum(np.bincount(groups, minlength=len(self._groups)), out=starts[1:])
+            self._group_order = (key, order, starts)
+        _, order, starts = self._group_order
+        return order[starts[group_index] : starts[group_index + 1]]
+
+    def _rebuild(self, table_entries):
+        version = self.version
+        self.__init__(table_entries)
+        self.version = version + 1
+
+    def _new_group(self, signature):
+        group = _EntryGroup(len(self._groups), signature, self._strings, self._intern)
+        self._groups.append(group)
+        self._group_index[signature] = group
+        return group
+
+    def _add_to_group(self, signature, table_entry):
+        group = self._group_index.get(signature)
+        if group is None:
+            group = self._new_group(signature)
+        self._entry_group.append(group.index)
+        self._entry_row.append(group.count)
+        group.add_object(table_entry)
+
+    def _intern(self, value):
+        string_id = self._string_ids.get(value)
+        if string_id is None:
+            string_id = self._string_ids[value] = len(self._strings)
+            self._strings.append(value)
+        return string_id
+
+    def copy_range(self, start, stop):
+        """
+        Returns a new store with the entries in range(start, stop), copied column by
+        column without creating the entry dicts
+        """
+        store = TableEntryStore()
+        groups = self._groups
+        strings = self._strings
+        for group_index, row in zip(
+            self._entry_group[start:stop], self._entry_row[start:stop]
+        ):
+            group = groups[group_index]
+            if group.generic:
+                store._add_to_group(_GENERIC_SIGNATURE, group.objects[row])
+                continue
+            target = store._group_index.get(group.signature)
+            if target is None:
+                target = store._new_group(group.signature)
+            store._entry_group.append(target.index)
+            store._entry_row.append(target.count)
+            for codec, column, target_column in zip(
+                group.leaf_codecs, group.columns, target.columns
+            ):
+                value = column[row]
+                if codec == "s":
+                    value = store._intern(strings[value])
+                target_column.append(value)
+            target.count += 1
+        return store
+
+
+class EntryColumns(object):
+    """
+    The values of a group of entries of a TableEntryStore with the same table,
+    action and names, see TableEntryStore.column_groups. Only the rows in
+    range(start_row, stop_row) of the columns are in the requested range.
+
+    match_fields and action_params map every name to the codec and column of its
+    values. Codecs are "i" for ints, "4" and "m" for ipv4 and MAC addresses stored
+    as ints, and "s" for ids into strings. [value, value] pairs have a tuple of two
+    codecs and a tuple of two columns. Entries that can not be stored in columns
+    are in a group with generic set and no names or columns.
+    """
+
+    def __init__(self, store, group, start_row, stop_row) -> None:
+        self._store = store
+        self.group_index = group.index
+        self.start_row = start_row
+        self.stop_row = stop_row
+        self.generic = group.generic
+        self.table_name = group.table_name
+        self.action_name = group.action_name
+        self.strings = store._strings
+        self.match_fields = {}
+        self.action_params = {}
+        if self.generic:
+            return
+
+        columns = iter(group.columns)
+        for name, codec in zip(group.match_names, group.match_codecs):
+            if type(codec) is tuple:
+                self.match_fields[name] = (codec, (next(columns), next(columns)))
+            else:
+                self.match_fields[name] = (codec, next(columns))
+        # Params are never pairs, so they take the last columns
+        param_codecs = group.leaf_codecs[len(group.columns) - len(group.param_names) :]
+        for name, codec in zip(group.param_names, param_codecs):
+            self.action_params[name] = (codec, next(columns))
+
+    def __len__(self):
+        return self.stop_row - self.start_row
+
+    def entry_indices(self, rows=None):
+        """
+        Indices in the store of the entries of the given rows
+
+        Args:
+            rows (list, optional): Rows relative to start_row. Defaults to all rows in the range.
+
+        Returns:
+            list: Entry indices
+        """
+        indices = self._store._group_entry_indices(self.group_index)
+        indices = indices[self.start_row : self.stop_row]
+        if rows is not None:
+            indices = [indices[row] for row in rows]
+        # Plain ints, also when the indices come from NumPy
+        return [int(index) for index in indices]
+
+
+def _count_groups(entry_groups, group_count):
+    # Number of entries of every group
+    if np is not None:
+        groups = np.frombuffer(entry_groups, dtype=f"u{entry_groups.itemsize}")
+        return np.bincount(groups, minlength=group_count).tolist()
+    counts = Counter(entry_groups)
+    return [counts[group] for group in range(group_count)]
+
+
+# Signature of the group holding entries that can not be stored in columns
+_GENERIC_SIGNATURE = ("generic",)
+
+
+def _signature(table_name, action_name, match_fields, action_params, leaves):
+    # Group of an entry, None if it can not be stored in columns. The column values
+    # of the entry are appended to leaves.
+    codecs = []
+    if (
+        type(table_name) is not str
+        or type(action_name) is not str
+        or type(match_fields) is not dict
+        or type(action_params) is not dict
+        or not _encode_values(match_fields.values(), codecs, leaves, True)
+        or not _encode_values(action_params.values(), codecs, leaves, False)
+    ):
+        return None
+    return (
+        table_name,
+        action_name,
+        tuple(match_fields),
+        tuple(action_params),
+        tuple(codecs),
+    )
+
+
+def _encode_values(values, codecs, leaves, pairs):
+    # Appends the storage type and column value of every value, returns False if a
+    # value has no storage type. Pairs take two columns and a tuple of two types.
+    for value in values:
+        value_type = type(value)
+        if value_type is str:
+            codec, leaf = _encode_str(value)
+        elif value_type is int and _INT_MIN <= value <= _INT_MAX:
+            codec, leaf = "i", value
+        elif pairs and value_type is list and len(value) == 2:
+            first = _encode_scalar(value[0])
+            second = _encode_scalar(value[1])
+            if first is None or second is None:
+                return False
+            codecs.append((first[0], second[0]))
+            leaves.append(first[1])
+            leaves.append(second[1])
+            continue
+        else:
+            return False
+        codecs.append(codec)
+        leaves.append(leaf)
+    return True
+
+
+def _encode_scalar(value):
+    value_type = type(value)
+    if value_type is str:
+        return _encode_str(value)
+    if value_type is int and _INT_MIN <= value <= _INT_MAX:
+        return "i", value
+    return None
+
+
+@lru_cache(maxsize=1 << 16)
+def _encode_str(value):
+    # Addresses are only stored as ints if they are written the way they are
+    # converted back, so the entries stay exactly as they were added
+    if 7 <= len(value) <= 15:
+        try:
+            addr = _ipv4_to_int(value)
+            if _int_to_ipv4(addr) == value:
+                return "4", addr
+        except (OSError, ValueError):
+            pass
+    elif len(value) == 17 and value[2] == ":":
+        try:
+            mac = mac_to_int(value)
+            if int_to_mac(mac) == value:
+                return "m", mac
+        except ValueError:
+            pass
+    return "s", value
+
+
+def _column_value(codec, value):
+    # Address as stored in a column of the given type
+    if type(value) is int:
+        return value
+    value_codec, leaf = _encode_str(value)
+    if value_codec != codec:
+        raise ValueError(f"Invalid address {value}")
+    return leaf
+
+
+_ARRAY_TYPES = {"i": "q", "4": "I", "m": "Q", "s": "I"}
+
+
+class _EntryGroup(object):
+    def __init__(self, index, signature, strings, intern) -> None:
+        self.index = index
+        self.signature = signature
+        self.count = 0
+        self.generic = signature == _GENERIC_SIGNATURE
+        if self.generic:
+            self.table_name = None
+            self.action_name = None
+            self.objects = []
+            return
+
+        (
+            self.table_name,
+            self.action_name,
+            self.match_names,
+            self.param_names,
+            codecs,
+        ) = signature
+        self.match_codecs = codecs[: len(self.match_names)]
+        # One column per scalar value, pairs take two
+        self.leaf_codecs = [
+            leaf
+            for codec in codecs
+            for leaf in (codec if type(codec) is tuple else (codec,))
+        ]
+        self.columns = [array(_ARRAY_TYPES[codec]) for codec in self.leaf_codecs]
+        # Interned strings of the store
+        self.strings = strings
+        self.intern = intern
+
+    def add_object(self, table_entry):
+        self.objects.append(table_entry)
+        self.count += 1
+
+    def add_leaves(self, leaves):
+        for codec, column, leaf in zip(self.leaf_codecs, self.columns, leaves):
+            if codec == "s":
+                leaf = self.intern(leaf)
+            column.append(leaf)
+        self.count += 1
+
+    def entry(self, row):
+        if self.generic:
+            return self.objects[row]
+
+        strings = self.strings
+        leaves = []
+        for codec, column in zip(self.leaf_codecs, self.columns):
+            value = column[row]
+            if codec == "4":
+                value = _int_to_ipv4(value)
+            elif codec == "m":
+                value = int_to_mac(value)
+            elif codec == "s":
+                value = strings[value]
+            leaves.append(value)
+        return _fill(self, iter(leaves))
+
+    def json_formatter(self, encode_item):
+        if self.generic:
+            objects = self.objects
+            return lambda row: encode_item(objects[row])
+
+        # Encode a sample entry with a unique placeholder string in every value
+        placeholders = [f"\x00{i}\x00" for i in range(len(self.columns))]
+        sample = _fill(self, iter(placeholders))
+        template = encode_item(sample).replace("{", "{{").replace("}", "}}")
+        for i, placeholder in enumerate(placeholders):
+            template = template.replace(json.dumps(placeholder), "{%d}" % i)
+        format_template = template.format
+
+        strings = self.strings
+        encoders = []
+        for codec in self.leaf_codecs:
+            if codec == "i":
+                encoders.append(_int_to_json)
+            elif codec == "4":
+                encoders.append(_ipv4_to_json)
+            elif codec == "m":
+                encoders.append(_mac_to_json)
+            else:
+                encoders.append(lambda value: json.dumps(strings[value]))
+        columns = list(zip(encoders, self.columns))
+        return lambda row: format_template(
+            *[encode(column[row]) for encode, column in columns]
+        )
+
+
+def _fill(group, leaves):
+    # Entry dict of a group with the given leaf values
+    match_fields = {}
+    for name, codec in zip(group.match_names, group.match_codecs):
+        if type(codec) is tuple:
+            match_fields[name] = [next(leaves), next(leaves)]
+        else:
+            match_fields[name] = next(leaves)
+    action_params = {name: next(leaves) for name in group.param_names}
+    return {
+        "table_name": group.table_name,
+        "action_name": group.action_name,
+        "match_fields": match_fields,
+        "action_params": action_params,
+    }
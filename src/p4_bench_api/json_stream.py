@@ -0,0 +1,467 @@
+"""
+Streaming json reading and writing of network setups and table entry files.
+
+The writer produces exactly the same bytes as json.dump(setup.to_dict(), f, indent=4,
+sort_keys=True) in its default mode, without building the complete dict and string in
+memory first. Large lists, like the table entries of a switch, are written in chunks.
+
+The reader parses files incrementally, so table entry files and setup files larger than
+memory can be loaded one element at a time. Table entry files can either be a json
+array or json lines (one entry object per line).
+"""
+
+import gzip
+import io
+import json
+import re
+
+try:
+    import zstandard
+except ImportError:  # Only needed for zstd compressed files
+    zstandard = None
+
+# Number of list elements encoded per json.dumps call when streaming
+CHUNK_SIZE = 1024
+
+COMPRESSION_TYPES = (None, "gzip", "zstd")
+
+# Number of characters read at a time when parsing incrementally
+READ_SIZE = 1 << 16
+
+_GZIP_MAGIC = b"\x1f\x8b"
+_ZSTD_MAGIC = b"\x28\xb5\x2f\xfd"
+
+
+def open_text(path, mode="r", compression=None):
+    """
+    Opens a possibly compressed file in text mode
+
+    Args:
+        path (str): Path to the file
+        mode (str, optional): "r" or "w". Defaults to "r".
+        compression (str, optional): None, "gzip" or "zstd". Defaults to None.
+
+    Returns:
+        File object for reading or writing text
+    """
+    if compression not in COMPRESSION_TYPES:
+        raise ValueError(f"Unsupported compression {compression}")
+
+    if compression is None:
+        return open(path, mode)
+    if compression == "gzip":
+        return gzip.open(path, mode + "t")
+
+    if zstandard is None:
+        raise ImportError("zstd compression requires the zstandard package")
+    raw = open(path, mode + "b")
+    if mode == "w":
+        stream = zstandard.ZstdCompressor().stream_writer(raw, closefd=True)
+    else:
+        stream = zstandard.ZstdDecompressor().stream_reader(raw, closefd=True)
+    return io.TextIOWrapper(stream)
+
+
+def detect_compression(path):
+    """
+    Detects the compression of a file from its first bytes
+
+    Args:
+        path (str): Path to the file
+
+    Returns:
+        str: None, "gzip" or "zstd"
+    """
+    with open(path, "rb") as f:
+        magic = f.read(4)
+    if magic.startswith(_GZIP_MAGIC):
+        return "gzip"
+    if magic.startswith(_ZSTD_MAGIC):
+        return "zstd"
+    return None
+
+
+class _StreamWriter(object):
+    def __init__(self, fp, indent=4, sort_keys=True) -> None:
+        self.write = fp.write
+        self.indent = indent
+        self.sort_keys = sort_keys
+        if indent is None:
+            self.item_separator = ","
+            self.key_separator = ":"
+        else:
+            self.item_separator = ","
+            self.key_separator = ": "
+
+    def _newline(self, level):
+        if self.indent is None:
+            return ""
+        return "\n" + " " * (self.indent * level)
+
+    def _dumps(self, value):
+        return json.dumps(
+            value,
+            indent=self.indent,
+            sort_keys=self.sort_keys,
+            separators=(self.item_separator, self.key_separator),
+        )
+
+    def write_value(self, value, level=0):
+        if isinstance(value, _Devices):
+            self.write_dict(value.devices, level, value.to_dict)
+        elif isinstance(value, dict):
+            self.write_dict(value, level)
+        elif isinstance(value, (str, int, float, bool)) or value is None:
+            self.write(self._dumps(value))
+        else:
+            self.write_list(value, level)
+
+    def write_dict(self, mapping, level=0, convert=None):
+        keys = sorted(mapping) if self.sort_keys else list(mapping)
+
+        first = True
+        inner_newline = self._newline(level + 1)
+        self.write("{")
+        for key in keys:
+            if first:
+                self.write(inner_newline)
+                first = False
+            else:
+                self.write(self.item_separator + inner_newline)
+            self.write(json.dumps(key) + self.key_separator)
+            value = mapping[key]
+            if convert is not None:
+                value = convert(value)
+            self.write_value(value, level + 1)
+        if not first:
+            self.write(self._newline(level))
+        self.write("}")
+
+    def write_list(self, values, level=0):
+        # Encode chunks of elements at once and splice them into the output.
+        # dumps() indents the chunk as if it was on level 0, so every line is
+        # shifted to the level of the list.
+        newline = self._newline(level)
+        first = True
+        self.write("[")
+        if hasattr(values, "iter_json_items"):
+            chunks = self._store_chunks(values)
+        else:
+            chunks = (self._dumps(chunk) for chunk in _chunks(values, CHUNK_SIZE))
+        for encoded in chunks:
+            if self.indent is None:
+                inner = encoded[1:-1]
+            else:
+                inner = encoded[2:-2].replace("\n", newline)
+            if first:
+                self.write(newline + inner)
+                first = False
+            else:
+                self.write(self.item_separator + newline + inner)
+        if not first:
+            self.write(newline)
+        self.write("]")
+
+    def _store_chunks(self, store):
+        # Table entry stores encode their entries from templates, see
+        # TableEntryStore.iter_json_items. The items are joined into chunks that
+        # look like the output of dumps().
+        if self.indent is None:
+            start, separator, end = "[", self.item_separator, "]"
+        else:
+            start, separator, end = "[\n", self.item_separator + "\n", "\n]"
+        size = len(start)
+        encode_item = lambda item: self._dumps([item])[size:-size]
+        items = store.iter_json_items(encode_item)
+        for chunk in _chunks(items, CHUNK_SIZE):
+            yield start + separator.join(chunk) + end
+
+
+def _chunks(values, size):
+    chunk = []
+    for value in values:
+        chunk.append(value)
+        if len(chunk) == size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def write_setup(network_setup, fp, indent=4, sort_keys=True):
+    """
+    Writes a network setup as json to an open file, streaming the devices and table
+    entries one at a time.
+
+    Args:
+        network_setup (NetworkSetup): Setup to write
+        fp: Text file object to write to
+        indent (int, optional): Indentation. None gives compact output. Defaults to 4.
+        sort_keys (bool, optional): Sort the keys of all objects. Defaults to True.
+    """
+    # Later devices with the same name replace earlier ones, like in to_dict
+    nodes = {}
+    for node in network_setup.nodes:
+        nodes[node.name] = node
+    switches = {}
+    for switch in network_setup.switches:
+        switches[switch.name] = switch
+
+    writer = _StreamWriter(fp, indent, sort_keys)
+    writer.write_dict(
+        {
+            "nodes": _Devices(nodes, lambda node: node.to_dict()),
+            "switches": _Devices(switches, lambda switch: switch.to_dict(lazy=True)),
+            "links": (link.to_dict() for link in network_setup.links),
+        }
+    )
+
+
+class _Devices(object):
+    # Devices by name, converted to dicts only when they are written
+    def __init__(self, devices, to_dict) -> None:
+        self.devices = devices
+        self.to_dict = to_dict
+
+
+def save_setup(network_setup, path, indent=4, sort_keys=True, compression=None):
+    """
+    Saves a network setup to a json file. See write_setup.
+
+    Args:
+        network_setup (NetworkSetup): Setup to save
+        path (str): Path to the file
+        indent (int, optional): Indentation. None gives compact output. Defaults to 4.
+        sort_keys (bool, optional): Sort the keys of all objects. Defaults to True.
+        compression (str, optional): None, "gzip" or "zstd". Defaults to None.
+    """
+    with open_text(path, "w", compression) as fp:
+        write_setup(network_setup, fp, indent, sort_keys)
+
+
+def save_table_entries(table_entries, path, indent=4, sort_keys=True, compression=None):
+    """
+    Saves a list of table entries to a json file, streaming them in chunks
+
+    Args:
+        table_entries (list): Table entries to save
+        path (str): Path to the file
+        indent (int, optional): Indentation. None gives compact output. Defaults to 4.
+        sort_keys (bool, optional): Sort the keys of all objects. Defaults to True.
+        compression (str, optional): None, "gzip" or "zstd". Defaults to None.
+    """
+    with open_text(path, "w", compression) as fp:
+        _StreamWriter(fp, indent, sort_keys).write_list(table_entries)
+
+
+class _StreamReader(object):
+    """
+    Incremental json parser over a text file object. Values are decoded one at a time
+    with json.JSONDecoder.raw_decode from a buffer that only holds the part of the
+    file currently being parsed.
+    """
+
+    _whitespace = re.compile(r"[ \t\n\r]*")
+    # A literal, number or escape without any delimiters
+    _token = re.compile(r'[^ \t\n\r,:\[\]{}"]*')
+
+    def __init__(self, fp, read_size=READ_SIZE) -> None:
+        self.fp = fp
+        self.read_size = read_size
+        self.decoder = json.JSONDecoder()
+        self.buf = ""
+        self.pos = 0
+        self.eof = False
+
+    def _fill(self):
+        if self.eof:
+            return False
+        # Read at least as much as is already buffered, so a single large value
+        # is only decoded a logarithmic number of times
+        data = self.fp.read(max(self.read_size, len(self.buf) - self.pos))
+        if not data:
+            self.eof = True
+            return False
+        self.buf = self.buf[self.pos :] + data
+        self.pos = 0
+        return True
+
+    def _error(self, message):
+        return json.JSONDecodeError(message, self.buf, self.pos)
+
+    def peek(self):
+        while True:
+            self.pos = self._whitespace.match(self.buf, self.pos).end()
+            if self.pos < len(self.buf):
+                return self.buf[self.pos]
+            if not self._fill():
+                return ""
+
+    def expect(self, char):
+        if self.peek() != char:
+            raise self._error(f"Expecting {char!r}")
+        self.pos += 1
+
+    def read_value(self):
+        self.peek()
+        while True:
+            try:
+                value, end = self.decoder.raw_decode(self.buf, self.pos)
+            except json.JSONDecodeError as e:
+                # Only a value cut off by the end of the buffer can be fixed by
+                # reading more, other errors are raised without buffering the rest
+                # of the file
+                if self._truncated(e) and self._fill():
+                    continue
+                raise
+            # A number at the end of the buffer might continue in the next read
+            if end == len(self.buf) and self._fill():
+                continue
+            self.pos = end
+            return value
+
+    def _truncated(self, error):
+        # The error is at the end of the buffer, in a string running to the end or
+        # in a token running to the end, e.g. "tru" or "\u00"
+        if error.msg.startswith("Unterminated string"):
+            return True
+        return self._token.match(self.buf, error.pos).end() == len(self.buf)
+
+    def _next_item(self, closing):
+        char = self.peek()
+        if char == ",":
+            self.pos += 1
+            return True
+        if char == closing:
+            self.pos += 1
+            return False
+        raise self._error(f"Expecting ',' or {closing!r}")
+
+    def iter_array(self):
+        """
+        Yields the values of the array at the current position one at a time
+        """
+        self.expect("[")
+        if self.peek() == "]":
+            self.pos += 1
+            return
+        while True:
+            yield self.read_value()
+            if not self._next_item("]"):
+                return
+
+    def iter_object(self):
+        """
+        Yields the keys of the object at the current position. The value of each key
+        must be consumed with read_value, iter_array or iter_object before the next
+        key is requested.
+        """
+        self.expect("{")
+        if self.peek() == "}":
+            self.pos += 1
+            return
+        while True:
+            if self.peek() != '"':
+                raise self._error("Expecting property name enclosed in double quotes")
+            key = self.read_value()
+            self.expect(":")
+            yield key
+            if not self._next_item("}"):
+                return
+
+    def skip_value(self):
+        # Arrays are skipped element by element to keep memory bounded
+        if self.peek() == "[":
+            for _ in self.iter_array():
+                pass
+        elif self.peek() == "{":
+            for _ in self.iter_object():
+                self.skip_value()
+        else:
+            self.read_value()
+
+
+def iter_table_entries(path, compression="auto"):
+    """
+    Yields the table entries of a table entry file one at a time. The file can hold a
+    json array of entries or json lines with one entry per line.
+
+    Args:
+        path (str): Path to the file
+        compression (str, optional): None, "gzip", "zstd" or "auto" to detect it. Defaults to "auto".
+    """
+    if compression == "auto":
+        compression = detect_compression(path)
+
+    with open_text(path, "r", compression) as fp:
+        reader = _StreamReader(fp)
+        first = reader.peek()
+        if first == "[":
+            yield from reader.iter_array()
+        else:
+            # Json lines, each value is parsed as soon as it is complete
+            while reader.peek():
+                yield reader.read_value()
+
+
+def iter_setup_table_entries(path, switch_name, compression="auto"):
+    """
+    Yields the table entries of one switch in a setup file one at a time
+
+    Args:
+        path (str): Path to the setup file
+        switch_name (str): Name of the switch
+        compression (str, optional): None, "gzip", "zstd" or "auto" to detect it. Defaults to "auto".
+    """
+    if compression == "auto":
+        compression = detect_compression(path)
+
+    with open_text(path, "r", compression) as fp:
+        reader = _StreamReader(fp)
+        for key in reader.iter_object():
+            if key != "switches":
+                reader.skip_value()
+                continue
+            for name in reader.iter_object():
+                if name != switch_name:
+                    reader.skip_value()
+                    continue
+                for switch_key in reader.iter_object():
+                    if switch_key == "table_entries":
+                        yield from reader.iter_array()
+                    else:
+                        reader.skip_value()
+
+
+def read_setup_base(path, compression="auto"):
+    """
+    Reads a setup file without its table entries. The table entries are parsed one
+    at a time and dropped, so memory use only depends on the size of the base setup.
+
+    Args:
+        path (str): Path to the setup file
+        compression (str, optional): None, "gzip", "zstd" or "auto" to detect it. Defaults to "auto".
+
+    Returns:
+        dict: The setup on the same form as NetworkSetup.to_dict, with empty table entries
+    """
+    if compression == "auto":
+        compression = detect_compression(path)
+
+    data = {}
+    with open_text(path, "r", compression) as fp:
+        reader = _StreamReader(fp)
+        for key in reader.iter_object():
+            if key != "switches":
+                data[key] = reader.read_value()
+                continue
+            switches = data[key] = {}
+            for name in reader.iter_object():
+                switch_info = switches[name] = {}
+                for switch_key in reader.iter_object():
+                    if switch_key == "table_entries":
+                        reader.skip_value()
+                        switch_info[switch_key] = []
+                    else:
+                        switch_info[switch_key] = reader.read_value()
+    return data
@@ -1,5 +1,25 @@
-from .p4_helper import P4InfoHelper
-import logging
+from .allocators import PortAllocator
+from .entry_store import TableEntryStore
+from .validation import (
+    DUPLICATE_NODE,
+    DUPLICATE_SWITCH,
+    INVALID_LINK,
+    INVALID_SERVER_PORT,
+    NO_P4_INFO,
+    NODE_NOT_CONNECTED,
+    PORT_IN_USE,
+    SERVER_PORT_IN_USE,
+    SEVERITY_INFO,
+    SWITCH_NAME_USED_BY_NODE,
+    SWITCH_NOT_CONNECTED,
+    TABLE_TOO_LARGE,
+    UNDEFINED_LINK_DEVICE,
+    EntryChecker,
+    ValidationResult,
+    check_table_entry,
+    load_schemas,
+)
+from collections import Counter
 
 
 class Node(object):
@@ -7,7 +27,7 @@ class Node(object):
         self.name = name
         self.iface = ""
         self.ipv4_addr = ipv4_addr
-        self.used_ports = []
+        self.ports = PortAllocator()
         self.id = node_id
         self.mac_addr = mac_addr
 
@@ -23,15 +43,27 @@ class Node(object):
     def add_ipv4_addres(self, addr):
         self.ipv4_addr = addr
 
+    @property
+    def used_ports(self):
+        return self.ports.to_list()
+
+    @used_ports.setter
+    def used_ports(self, ports):
+        self.ports = PortAllocator(ports)
+
     def add_port(self, port_nr):
-        if not port_nr in self.used_ports:
-            self.used_ports.append(port_nr)
+        self.ports.reserve(port_nr)
 
     def generate_port(self):
-        for i in range(len(self.used_ports) + 1):
-            if not i in self.used_ports:
-                self.used_ports.append(i)
-                return i
+        return self.ports.allocate()
+
+    def to_dict(self):
+        return {
+            "ipv4_addr": self.ipv4_addr,
+            "used_ports": self.used_ports,
+            "id": self.id,
+            "mac_addr": self.mac_addr,
+        }
 
 
 class Switch(object):
@@ -41,8 +73,8 @@ class Switch(object):
         self.p4_prog_name = p4_prog_name
         self.p4_info_path = p4_info_path
         self.server_port = server_port
-        self.table_entries = []
-        self.used_ports = []
+        self.table_entries = TableEntryStore()
+        self.ports = PortAllocator()
 
     def __eq__(self, other):
         if isinstance(other, Switch):
@@ -54,184 +86,113 @@ class Switch(object):
         if not table_name in self.table_entries:
             self.table_entries.append(table_name)
 
-    def add_port(self, port_nr):
-        if not port_nr in self.used_ports:
-            self.used_ports.append(port_nr)
-            return True
-        return False
-
-    def generate_port(self):
-        for i in range(len(self.used_ports) + 1):
-            if not i in self.used_ports:
-                self.used_ports.append(i)
-                return i
-
-    def add_table_entry(self, table_name, action_name, match_fields, action_params):
-        self.table_entries.append(
-            {
-                "table_name": table_name,
-                "action_name": action_name,
-                "match_fields": match_fields,
-                "action_params": action_params,
-            }
-        )
-
-    def validate_p4_entries(self):
-        if self.p4_info_path:
-            helper = P4InfoHelper(self.p4_info_path)
-
-            for table_entry in self.table_entries:
+    @property
+    def used_ports(self):
+        return self.ports.to_list()
 
-                table_entry_isvalid = True
+    @used_ports.setter
+    def used_ports(self, ports):
+        self.ports = PortAllocator(ports)
 
-                table_name = table_entry["table_name"]
-                action_name = table_entry["action_name"]
-                match_fields = table_entry["match_fields"]
-                action_params = table_entry["action_params"]
+    @property
+    def table_entries(self):
+        return self._table_entries
 
-                # Get values in simple form
-                tables = helper.getAllTables()
-                actions = helper.getAllActions()
+    @table_entries.setter
+    def table_entries(self, table_entries):
+        # Entries are always kept in a compact store, see entry_store
+        if not isinstance(table_entries, TableEntryStore):
+            table_entries = TableEntryStore(table_entries)
+        self._table_entries = table_entries
 
-                if type(table_name) != str:
-                    print(f"Table name should be a string")
-                    print_table_entry_info(self.name, table_entry)
-                    return False
-
-                # Check if table exist with same name/alias
-                table_for_check = None
-                for table in tables:
-                    if table.name == table_name or table.alias == table.name:
-                        table_for_check = table
-                        break
-
-                if not table_for_check:
-                    if not table_name:
-                        table_name = "None"
+    def add_port(self, port_nr):
+        return self.ports.reserve(port_nr)
 
-                    print(
-                        f"Error in table entry. Table with name {table_name} could not be found in p4 info file"
-                    )
-                    print_table_names(tables)
-                    print_table_entry_info(self.name, table_entry)
-                    return False
-
-                # Check match_field
-                mf_to_check = table_for_check.match_fields
-
-                if not isinstance(match_fields, dict):
-                    print(f"Error switch: {self.name}. Match_fields should be a dict.")
-                    print_match_field_keys(mf_to_check)
-                    table_entry_isvalid = False
-
-                else:
-                    key_list = list(match_fields.keys())
-                    if len(key_list) == 0:
-                        logging.error(f"Match_field has no keys")
-                        print_match_field_keys(mf_to_check)
-                        table_entry_isvalid = False
-                    else:
-                        key = key_list[0]
-
-                        if key != mf_to_check.name:
-                            print(f"Incorrect match name: {key} in p4 file")
-                            print_match_field_keys(mf_to_check)
-                            table_entry_isvalid = False
-
-                        # Check match type
-                        match_type = mf_to_check.match_type
-                        match_fields_correct = True
-
-                        # Exact match
-                        if match_type == 2:
-                            logging.info("Not implemented")
-                        # LPM match
-                        elif match_type == 3:
-                            value = match_fields[key]
-                            if not type(value) == list:
-                                print(
-                                    f"Error match fields. Expected type list as input for match field value. Got {type(value)}"
-                                )
-                                match_fields_correct = False
-                            else:
-                                if not isinstance(value[1], int):
-                                    print(
-                                        f"Error match fields. Second value should be an integer for LPM match"
-                                    )
-                                    match_fields_correct = False
-                            if len(value) != 2:
-                                print(
-                                    f"Error match fields. Expected list of length 2 as input. Got {value}"
-                                )
-                                match_fields_correct = False
-
-                        # Ternary match
-                        elif match_type == 4:
-                            pass
-                        if not match_fields_correct:
-                            table_entry_isvalid = False
-
-                # Check action
-                if type(action_name) != str:
-                    print("Action name should be a string")
-                    print_table_entry_info(self.name, table_entry)
-                    print_avaialble_actions(table.action_refs, actions)
-                    table_entry_isvalid = False
-
-                action_for_check = None
-                for act in actions:
-                    if act.name == action_name or act.alias == action_name:
-                        action_for_check = act
-                        break
-
-                if not action_for_check:
-                    logging.error(
-                        f"Action with name {action_name} could not be found in p4 file"
-                    )
+    def generate_port(self):
+        return self.ports.allocate()
+
+    def to_dict(self, lazy=False):
+        """
+        Args:
+            lazy (bool, optional): Return the table entry store instead of a list of
+                entry dicts. Used by the json writer to stream the entries. Defaults to False.
+        """
+        return {
+            "table_entries": self.table_entries if lazy else list(self.table_entries),
+            "used_ports": self.used_ports,
+            "p4_prog_name": self.p4_prog_name,
+            "server_port": self.server_port,
+            "p4_info_path": self.p4_info_path,
+        }
 
-                    print_avaialble_actions(table.action_refs, actions)
-
-                    table_entry_isvalid = False
-                else:
-                    # Check if required parameters are given
-                    if action_for_check.params:
-                        if type(action_params) != dict:
-                            print(
-                                'Error action params. Should be a dict on format "parametername":"parameter value" '
-                            )
-                            print_action_params_info(action_for_check.params)
-                            table_entry_isvalid = False
-
-                        else:
-                            key = list(action_params.keys())[0]
-                            val = list(action_params.values())[0]
-
-                            if not action_params:
-                                print(f"Action parameter was not given")
-                                print_action_params_info(action_for_check.params)
-                                table_entry_isvalid = False
-                            if not key == action_for_check.params.name:
-                                print(f"Action key did not match key in P4 file")
-                                print_action_params_info(action_for_check.params)
-
-                            if action_for_check.params.bitwidth:
-                                max_val = 2 ^ action_for_check.params.bitwidth
-                                if val >= max_val:
-                                    print(f"Action param is to big")
-                                    table_entry_isvalid = False
-
-                    else:
-                        if action_params:
-                            print(
-                                f"{action_name} does not take input parameters. {action_params} was given"
-                            )
-                            table_entry_isvalid = False
-
-                if not table_entry_isvalid:
-                    print("Error in table entry. Check above on how to fix them")
+    def add_table_entry(self, table_name, action_name, match_fields, action_params):
+        self.table_entries.add(table_name, action_name, match_fields, action_params)
+
+    def add_table_entries(self, table_entries):
+        """
+        Adds table entries on json format in bulk. Accepts any iterable, so entries
+        can be streamed directly from a file.
+
+        Returns:
+            dict: The last added table entry, or None if no entries were given
+        """
+        add = self.table_entries.add
+        table_entry = None
+        for table_entry in table_entries:
+            add(
+                table_entry["table_name"],
+                table_entry["action_name"],
+                table_entry["match_fields"],
+                table_entry["action_params"],
+            )
+        return table_entry
+
+    def validate_p4_entries(self, print_errors=True):
+        """
+        Checks every table entry against the p4 info file of the switch and stops at
+        the first invalid entry
+
+        Args:
+            print_errors (bool, optional): Print the errors and the invalid entry. Defaults to True.
+
+        Returns:
+            bool: False if an entry is invalid
+        """
+        result = self.validate()
+        if print_errors:
+            result.print()
+            issues = result.errors()
+            if issues and issues[0].index is not None:
+                table_entry = self.table_entries[issues[0].index]
+                if isinstance(table_entry, dict):
                     print_table_entry_info(self.name, table_entry)
-                    return False
-        return table_entry_isvalid
+        return not result.has_errors
+
+    def validate(self):
+        """
+        Checks the table entries against the p4 info file of the switch, up to and
+        including the first invalid entry. Nothing is printed.
+
+        Returns:
+            ValidationResult: The errors of the first invalid entry
+        """
+        result = ValidationResult()
+        if not self.p4_info_path:
+            _add_skipped_entries(result, self)
+            return result
+
+        schema = load_schemas([self], result).get(self.p4_info_path)
+        if schema is None:
+            return result
+        for index, table_entry in enumerate(self.table_entries):
+            issues = check_table_entry(schema, table_entry)
+            if issues:
+                for issue in issues:
+                    issue.device = self.name
+                    issue.index = index
+                    result.add_issue(issue)
+                break
+        return result
 
     def __str__(self):
         return f"Name: {self.name}"
@@ -254,283 +215,393 @@ class Link(object):
             and self.conn_type in ["Node_to_Switch", "Node_to_Node", "Switch_to_Switch"]
         )
 
+    def to_dict(self):
+        return {
+            "device1": self.device1,
+            "device2": self.device2,
+            "device1_port": self.device1_port,
+            "device2_port": self.device2_port,
+            "type": self.conn_type,
+        }
+
     def __str__(self):
         return f"{self.device1}({self.device1_port})<--->({self.device2_port}){self.device2} Type: {self.conn_type}"
 
 
 class NetworkSetup(object):
+    """
+    Holds all devices and links of a setup. Besides the nodes, switches and links
+    lists, devices are indexed by name, id and server port. Always add and remove
+    devices through the add_*/remove_* functions so the indexes stay consistent,
+    and so check_for_errors knows what has changed since the last check.
+    """
+
     def __init__(self):
         self.nodes = []
         self.switches = []
         self.links = []
 
+        # Indexes, each key maps to the list of devices using it. Normally the lists
+        # only have one element, duplicates are reported by check_for_errors.
+        self._nodes_by_name = {}
+        self._nodes_by_id = {}
+        self._switches_by_name = {}
+        self._switches_by_server_port = {}
+
+        # Change tracking for check_for_errors. Devices and links added since the
+        # last successful check, by id since devices are not hashable.
+        self._dirty_nodes = {}
+        self._dirty_switches = {}
+        self._dirty_links = {}
+        # The next check has to look at everything
+        self._full_check = True
+        # (device name, port) -> number of valid links using it
+        self._link_ports = Counter()
+        # Remembers which table entries have been validated
+        self._entry_checker = EntryChecker()
+
     def add_node(self, node):
         self.nodes.append(node)
+        self._nodes_by_name.setdefault(node.name, []).append(node)
+        self._nodes_by_id.setdefault(node.id, []).append(node)
+        self._mark_dirty(self._dirty_nodes, node)
+        # A switch with the same name is no longer valid
+        for switch in self._switches_by_name.get(node.name, []):
+            self._mark_dirty(self._dirty_switches, switch)
 
     def add_link(self, link):
         self.links.append(link)
+        self._count_link_ports(link, 1)
+        self._mark_dirty(self._dirty_links, link)
+
+    def add_links(self, links):
+        for link in links:
+            self.add_link(link)
 
     def add_switch(self, switch):
         self.switches.append(switch)
+        self._switches_by_name.setdefault(switch.name, []).append(switch)
+        self._switches_by_server_port.setdefault(switch.server_port, []).append(switch)
+        self._mark_dirty(self._dirty_switches, switch)
+
+    def remove_node(self, node):
+        _remove_by_identity(self.nodes, node)
+        _remove_from_index(self._nodes_by_name, node.name, node)
+        _remove_from_index(self._nodes_by_id, node.id, node)
+        # Links to the node are not tracked, check everything again
+        self._full_check = True
+
+    def remove_switch(self, switch):
+        _remove_by_identity(self.switches, switch)
+        _remove_from_index(self._switches_by_name, switch.name, switch)
+        _remove_from_index(self._switches_by_server_port, switch.server_port, switch)
+        self._full_check = True
+
+    def remove_link(self, link):
+        if _remove_by_identity(self.links, link):
+            self._count_link_ports(link, -1)
+            self._dirty_links.pop(id(link), None)
+            # The devices might not be connected anymore
+            for name in (link.device1, link.device2):
+                for device in self._nodes_by_name.get(name, []):
+                    self._mark_dirty(self._dirty_nodes, device)
+                for device in self._switches_by_name.get(name, []):
+                    self._mark_dirty(self._dirty_switches, device)
+
+    def get_node(self, name):
+        nodes = self._nodes_by_name.get(name)
+        return nodes[0] if nodes else None
+
+    def get_node_by_id(self, node_id):
+        nodes = self._nodes_by_id.get(node_id)
+        return nodes[0] if nodes else None
+
+    def get_switch(self, name):
+        switches = self._switches_by_name.get(name)
+        return switches[0] if switches else None
+
+    def get_switch_by_server_port(self, server_port):
+        switches = self._switches_by_server_port.get(server_port)
+        return switches[0] if switches else None
+
+    def get_device(self, name):
+        """
+        Returns the node or switch with the given name. Nodes take precedence.
+        """
+        device = self.get_node(name)
+        if device is None:
+            device = self.get_switch(name)
+        return device
+
+    def has_node(self, node):
+        """
+        Checks if a node with the same name or id exists, see Node.__eq__
+        """
+        return node.name in self._nodes_by_name or node.id in self._nodes_by_id
+
+    def has_switch(self, switch):
+        """
+        Checks if a switch with the same name exists, see Switch.__eq__
+        """
+        return switch.name in self._switches_by_name
+
+    def update_switch_p4_info(self, switch, p4_prog_name, p4_info_path):
+        """
+        Changes the p4 program and p4 info file of a switch, so the next check looks
+        at the switch and all its table entries again
+        """
+        switch.p4_prog_name = p4_prog_name
+        switch.p4_info_path = p4_info_path
+        self._mark_dirty(self._dirty_switches, switch)
+        self._entry_checker.forget(switch)
 
     def update_switch_table(self, switch_name, table_name):
-        for switch in self.switches:
-            if switch_name == switch.name:
-                switch.update_table(table_name)
-
-    def to_dict(self):
+        for switch in self._switches_by_name.get(switch_name, []):
+            switch.update_table(table_name)
+
+    def to_dict(self, lazy=False):
+        """
+        Args:
+            lazy (bool, optional): Keep the table entries in their stores, see Switch.to_dict. Defaults to False.
+        """
         setup_dict = {}
 
         # Add nodes
         setup_dict["nodes"] = {}
         for node in self.nodes:
-            setup_dict["nodes"][node.name] = {
-                "ipv4_addr": node.ipv4_addr,
-                "used_ports": node.used_ports,
-                "id": node.id,
-                "mac_addr": node.mac_addr,
-            }
+            setup_dict["nodes"][node.name] = node.to_dict()
 
         setup_dict["switches"] = {}
         for switch in self.switches:
-            setup_dict["switches"][switch.name] = {
-                "table_entries": switch.table_entries,
-                "used_ports": switch.used_ports,
-                "p4_prog_name": switch.p4_prog_name,
-                "server_port": switch.server_port,
-                "p4_info_path": switch.p4_info_path,
-            }
+            setup_dict["switches"][switch.name] = switch.to_dict(lazy)
 
         setup_dict["links"] = []
 
         for link in self.links:
-            setup_dict["links"].append(
-                {
-                    "device1": link.device1,
-                    "device2": link.device2,
-                    "device1_port": link.device1_port,
-                    "device2_port": link.device2_port,
-                    "type": link.conn_type,
-                }
-            )
+            setup_dict["links"].append(link.to_dict())
 
         return setup_dict
 
-    def check_for_errors(self):
-        setup_invalid = False
-
-        for node in self.nodes:
-            nr_of_occ = len([x for x in self.nodes if x == node])
-            if nr_of_occ != 1:
-                print(f"Node {node.name} is defined multiple times. Id {node.id}")
-                setup_invalid = True
-
-            if len(node.used_ports) == 0:
-                print(f"Node {node.name} is not connected to the network")
-                setup_invalid = True
-
-        p4_isvalid = self.validate_p4_entries()
+    def check_for_errors(self, processes=None, max_errors=None, print_errors=True):
+        """
+        Checks the setup, see validate, and prints hints for every error found
+
+        Args:
+            processes (int, optional): Number of worker processes for validating table entries. Defaults to None.
+            max_errors (int, optional): Stop checking after this many errors. Defaults to None.
+            print_errors (bool, optional): Print the issues found. Defaults to True.
+
+        Returns:
+            bool: True if the setup has errors
+        """
+        result = self.validate(processes, max_errors)
+        if print_errors:
+            result.print()
+        return result.has_errors
+
+    def validate(self, processes=None, max_errors=None):
+        """
+        Checks the setup and collects every issue found, without printing. After a
+        check without errors, the next check only looks at the devices, links and
+        table entries added since, see the change tracking in add_*/remove_*.
+        Removing a device or a failed check makes the next check a full one.
+
+        Table entries are checked last, so with max_errors the errors of the setup
+        itself are found without going through all entries.
+
+        Args:
+            processes (int, optional): Number of worker processes for validating table entries. Defaults to None.
+            max_errors (int, optional): Stop checking after this many errors. Defaults to None.
+
+        Returns:
+            ValidationResult: The issues found
+        """
+        if self._full_check:
+            nodes = self.nodes
+            switches = self.switches
+            links = self.links
+            # Recount in case links were changed after they were added
+            self._link_ports = Counter()
+            for link in self.links:
+                self._count_link_ports(link, 1)
+        else:
+            nodes = list(self._dirty_nodes.values())
+            switches = list(self._dirty_switches.values())
+            links = list(self._dirty_links.values())
+        self._dirty_nodes = {}
+        self._dirty_switches = {}
+        self._dirty_links = {}
+
+        result = ValidationResult(max_errors)
+        add = result.add
+
+        # Nodes are equal if they share name or id, see Node.__eq__
+        for node in nodes:
+            if result.full:
+                break
+            if (
+                len(self._nodes_by_name[node.name]) != 1
+                or len(self._nodes_by_id[node.id]) != 1
+            ):
+                add(
+                    DUPLICATE_NODE,
+                    f"Node {node.name} is defined multiple times. Id {node.id}",
+                    node.name,
+                )
 
-        if not p4_isvalid:
-            setup_invalid = True
+            if len(node.ports) == 0:
+                add(
+                    NODE_NOT_CONNECTED,
+                    f"Node {node.name} is not connected to the network",
+                    node.name,
+                )
 
-        used_server_ports = []
-        for switch in self.switches:
-            nr_of_occ = len([x for x in self.switches if x == switch])
-
-            if nr_of_occ != 1:
-                print(f"Switch {switch.name} is defined multiple times")
-                setup_invalid = True
-            if len(switch.used_ports) == 0:
-                print(f"Switch {switch.name} is not connected to the network")
-                setup_invalid = True
-            if switch.server_port in used_server_ports:
-                print(f"Switch {switch.name} already used {switch.server_port}")
+        for switch in switches:
+            if result.full:
+                break
+            if not switch.p4_info_path:
+                _add_skipped_entries(result, switch)
+            if len(self._switches_by_name[switch.name]) != 1:
+                add(
+                    DUPLICATE_SWITCH,
+                    f"Switch {switch.name} is defined multiple times",
+                    switch.name,
+                )
+            if switch.name in self._nodes_by_name:
+                add(
+                    SWITCH_NAME_USED_BY_NODE,
+                    f"Switch {switch.name} has the same name as a node",
+                    switch.name,
+                )
+            if len(switch.ports) == 0:
+                add(
+                    SWITCH_NOT_CONNECTED,
+                    f"Switch {switch.name} is not connected to the network",
+                    switch.name,
+                )
             if type(switch.server_port) != int or switch.server_port < 0:
-                print(f"Switch {switch.name} invalid server port {switch.server_port}")
+                add(
+                    INVALID_SERVER_PORT,
+                    f"Switch {switch.name} invalid server port {switch.server_port}",
+                    switch.name,
+                )
+                continue
+            # The first switch added with a server port owns it
+            owners = self._switches_by_server_port.get(switch.server_port)
+            if owners and owners[0] is not switch:
+                add(
+                    SERVER_PORT_IN_USE,
+                    f"Switch {switch.name} server port {switch.server_port} already used by Switch {owners[0].name}",
+                    switch.name,
+                )
 
-        for link in self.links:
+        reported_ports = set()
+        for link in links:
+            if result.full:
+                break
             if not link.is_valid():
-                print(f"Link between {link.device1} and {link.device2} is not valid")
-                setup_invalid = True
-
-        return setup_invalid
+                add(
+                    INVALID_LINK,
+                    f"Link between {link.device1} and {link.device2} is not valid",
+                )
+                continue
+
+            for device, port in (
+                (link.device1, link.device1_port),
+                (link.device2, link.device2_port),
+            ):
+                if (
+                    device not in self._nodes_by_name
+                    and device not in self._switches_by_name
+                ):
+                    add(
+                        UNDEFINED_LINK_DEVICE,
+                        f"Link {link} uses device {device} which is not defined",
+                        device,
+                    )
+                nr_of_occ = self._link_ports[(device, port)]
+                if nr_of_occ != 1 and (device, port) not in reported_ports:
+                    reported_ports.add((device, port))
+                    add(
+                        PORT_IN_USE,
+                        f"Port {port} of {device} is used by {nr_of_occ} links",
+                        device,
+                    )
 
-    def validate_p4_entries(self):
-        # Go through table entries and provide feedback
+        # Switches whose p4 info file can not be loaded get an error and are skipped
+        schemas = load_schemas(self.switches, result)
+        if not result.full:
+            self._check_table_sizes(result, schemas)
+        if not result.full:
+            # Only entries added since the last check are validated
+            self._entry_checker.check(self.switches, result, processes, schemas=schemas)
+
+        self._full_check = result.has_errors
+        return result
+
+    def check_table_sizes(self, print_errors=True):
+        """
+        Checks that no switch has more entries in a table than the size declared in
+        its p4 info file. Tables without a declared size are not checked.
+
+        Args:
+            print_errors (bool, optional): Print the tables that are too large. Defaults to True.
+
+        Returns:
+            bool: True if all tables fit
+        """
+        result = ValidationResult()
+        self._check_table_sizes(result, load_schemas(self.switches, result))
+        if print_errors:
+            result.print()
+        return not result.has_errors
+
+    def validate_p4_entries(self, processes=None, max_errors=None, print_errors=True):
+        """
+        Checks the table entries of all switches, sorted by switch and entry index
+
+        Args:
+            processes (int, optional): Validate in a pool of worker processes, see validation.find_entry_errors. Defaults to None.
+            max_errors (int, optional): Stop checking after this many errors. Defaults to None.
+            print_errors (bool, optional): Print the issues found. Defaults to True.
+
+        Returns:
+            bool: True if all table entries are valid
+        """
+        result = ValidationResult(max_errors)
         for switch in self.switches:
-            if switch.p4_info_path:
-                helper = P4InfoHelper(switch.p4_info_path)
-
-                for table_entry in switch.table_entries:
-
-                    table_entry_isvalid = True
-
-                    table_name = table_entry["table_name"]
-                    action_name = table_entry["action_name"]
-                    match_fields = table_entry["match_fields"]
-                    action_params = table_entry["action_params"]
-
-                    # Get values in simple form
-                    tables = helper.getAllTables()
-                    actions = helper.getAllActions()
-
-                    if type(table_name) != str:
-                        print(f"Table name should be a string")
-                        print_table_entry_info(switch.name, table_entry)
-                        return False
-
-                    # Check if table exist with same name/alias
-                    table_for_check = None
-                    for table in tables:
-                        if table.name == table_name or table.alias == table.name:
-                            table_for_check = table
-                            break
-
-                    if not table_for_check:
-                        if not table_name:
-                            table_name = "None"
-
-                        print(
-                            f"Error in table entry. Table with name {table_name} could not be found in p4 info file"
-                        )
-                        print_table_names(tables)
-                        print_table_entry_info(switch.name, table_entry)
-                        return False
-
-                    # Check match_field
-                    mf_to_check = table_for_check.match_fields
-
-                    if not isinstance(match_fields, dict):
-                        print(
-                            f"Error switch: {switch.name}. Match_fields should be a dict."
-                        )
-                        print_match_field_keys(mf_to_check)
-                        table_entry_isvalid = False
-
-                    else:
-                        key_list = list(match_fields.keys())
-                        if len(key_list) == 0:
-                            logging.error(f"Match_field has no keys")
-                            print_match_field_keys(mf_to_check)
-                            table_entry_isvalid = False
-                        else:
-                            key = key_list[0]
-
-                            if key != mf_to_check.name:
-                                print(f"Incorrect match name: {key} in p4 file")
-                                print_match_field_keys(mf_to_check)
-                                table_entry_isvalid = False
-
-                            # Check match type
-                            match_type = mf_to_check.match_type
-                            match_fields_correct = True
-
-                            # Exact match
-                            if match_type == 2:
-                                logging.info("Not implemented")
-                            # LPM match
-                            elif match_type == 3:
-                                value = match_fields[key]
-                                if not type(value) == list:
-                                    print(
-                                        f"Error match fields. Expected type list as input for match field value. Got {type(value)}"
-                                    )
-                                    match_fields_correct = False
-                                else:
-                                    if not isinstance(value[1], int):
-                                        print(
-                                            f"Error match fields. Second value should be an integer for LPM match"
-                                        )
-                                        match_fields_correct = False
-                                if len(value) != 2:
-                                    print(
-                                        f"Error match fields. Expected list of length 2 as input. Got {value}"
-                                    )
-                                    match_fields_correct = False
-
-                            # Ternary match
-                            elif match_type == 4:
-                                pass
-                            if not match_fields_correct:
-                                table_entry_isvalid = False
-
-                    # Check action
-                    if type(action_name) != str:
-                        print("Action name should be a string")
-                        print_table_entry_info(switch.name, table_entry)
-                        print_avaialble_actions(table.action_refs, actions)
-                        table_entry_isvalid = False
-
-                    action_for_check = None
-                    for act in actions:
-                        if act.name == action_name or act.alias == action_name:
-                            action_for_check = act
-                            break
-
-                    if not action_for_check:
-                        logging.error(
-                            f"Action with name {action_name} could not be found in p4 file"
-                        )
-
-                        print_avaialble_actions(table.action_refs, actions)
-
-                        table_entry_isvalid = False
-                    else:
-                        # Check if required parameters are given
-                        if action_for_check.params:
-                            if type(action_params) != dict:
-                                print(
-                                    'Error action params. Should be a dict on format "parametername":"parameter value" '
-                                )
-                                print_action_params_info(action_for_check.params)
-                                table_entry_isvalid = False
-
-                            else:
-                                if len(action_params) == 0:
-                                    print(f"Empty dict was given for action params")
-                                    print_action_params_info(action_for_check.params)
-                                elif len(action_params) != len(action_for_check.params):
-                                    print(
-                                        f"Invalid number of params. Expected {len(action_for_check.params)} got {len(action_params)}"
-                                    )
-                                    print_action_params_info(action_for_check.params)
-                                else:
-                                    for key, val in action_params.items():
-                                        try:
-                                            action_param_for_check = [
-                                                para
-                                                for para in action_for_check.params
-                                                if para.name == key
-                                            ][0]
-                                        except IndexError:
-                                            print(
-                                                f"{key} is not a valid param name for action {action_for_check.name}"
-                                            )
-                                            print_action_params_info(
-                                                action_for_check.params
-                                            )
-                                            table_entry_isvalid = False
-
-                                        # Todo
-                                        # Check bitwidth
-
-                        else:
-                            if action_params:
-                                print(
-                                    f"{action_name} does not take input parameters. {action_params} was given"
-                                )
-                                table_entry_isvalid = False
-
-                    if not table_entry_isvalid:
-                        print("Error in table entry. Check above on how to fix them")
-                        print_table_entry_info(switch.name, table_entry)
-                        return False
-            else:
-                print(
-                    f"Switch: {switch.name} - Skipping checking p4 entries. No p4 info file defined"
-                )
-        return True
+            if not switch.p4_info_path:
+                _add_skipped_entries(result, switch)
+        EntryChecker().check(self.switches, result, processes)
+        if print_errors:
+            result.print()
+        return not result.has_errors
+
+    # Private functions
+    def _check_table_sizes(self, result, schemas):
+        for switch in self.switches:
+            schema = schemas.get(switch.p4_info_path)
+            if schema is None:
+                continue
+            counts = switch.table_entries.table_counts()
+            for table_name, count in counts.items():
+                table = schema.get_table(table_name)
+                if table and table.size and count > table.size:
+                    if not result.add(
+                        TABLE_TOO_LARGE,
+                        f"Switch {switch.name} has {count} entries in table {table_name}, but the table size is {table.size}",
+                        switch.name,
+                        table_name,
+                    ):
+                        return
+
+    def _mark_dirty(self, dirty, device):
+        dirty[id(device)] = device
+
+    def _count_link_ports(self, link, change):
+        if link.is_valid():
+            self._link_ports[(link.device1, link.device1_port)] += change
+            self._link_ports[(link.device2, link.device2_port)] += change
 
     def __str__(self):
         info_string = "--- Nodes ---\n"
@@ -547,6 +618,32 @@ class NetworkSetup(object):
         return info_string
 
 
+def _remove_by_identity(devices, device):
+    # list.remove would use __eq__, which matches other devices on name or id
+    for i, dev in enumerate(devices):
+        if dev is device:
+            del devices[i]
+            return True
+    return False
+
+
+def _remove_from_index(index, key, device):
+    devices = index.get(key)
+    if devices:
+        _remove_by_identity(devices, device)
+        if not devices:
+            del index[key]
+
+
+def _add_skipped_entries(result, switch):
+    result.add(
+        NO_P4_INFO,
+        f"Switch: {switch.name} - Skipping checking p4 entries. No p4 info file defined",
+        switch.name,
+        severity=SEVERITY_INFO,
+    )
+
+
 def print_table_entry_info(switch_name, table_entry):
     print("########## Table entry information #########")
     table_name = table_entry["table_name"]
@@ -567,40 +664,6 @@ def print_table_entry_info(switch_name, table_entry):
     print("########## End of table entry ##########")
 
 
-# Helper functions
-def print_table_names(tables):
-    ret_string = "Avaialble table names:"
-
-    for tab in tables:
-        ret_string += f"\n* {tab.name}"
-
-    print(ret_string)
-
-
-def print_match_field_keys(match_field):
-    print(f"Avaialable match keys \n {match_field.name}")
-
-
-def print_avaialble_actions(action_refs, actions):
-    print("Avaialble actions for table")
-    for act in actions:
-        if act.id in action_refs:
-            print(act.name)
-
-
-def print_action_params_info(action_params):
-    print("##### Action params info #####")
-
-    for action_para in action_params:
-        print(f"Name: {action_para.name}")
-        print(f"Id: {action_para.id}")
-        try:
-            print(f"Bitwidth: {action_para.bitwidth}")
-        except:
-            pass
-    print("##### Action params info #####")
-
-
 # simple testing
 def main():
 
@@ -200,7 +200,7 @@ def link_switch_to_switch(switch1_name, switch2_name, switch1_port=-1, switch2_p
     )
 
     if not link in networkSetup.links:
-        networkSetup.links.append(link)
+        networkSetup.add_link(link)
 
 
 def add_new_link(device1_name, device2_name, device1_port=-1, device2_port=-1):
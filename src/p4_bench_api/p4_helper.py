@@ -12,36 +12,189 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 #
+import hashlib
+import os
 import re
+import threading
+from collections import OrderedDict
 
+import google.protobuf.message
 import google.protobuf.text_format
 from p4.v1 import p4runtime_pb2
 from p4.config.v1 import p4info_pb2
 
 from .convert import encode
-from .table import Table, Match_Field, Action, Action_Params
+from .table import Table, Match_Field, Action, Action_Params, P4Schema
+
+_id_accessor_pattern = re.compile(r"^get_(\w+)_id$")
+_name_accessor_pattern = re.compile(r"^get_(\w+)_name$")
+
+# Maximum number of distinct p4info files kept parsed by get_p4info_helper
+P4INFO_CACHE_SIZE = 16
+
+_p4info_cache_lock = threading.Lock()
+_p4info_cache_by_stat = OrderedDict()  # (path, mtime, size) -> digest
+_p4info_cache_by_digest = OrderedDict()  # digest -> P4InfoHelper
+
+# Extensions of p4info files holding a binary serialized P4Info message
+BINARY_P4INFO_EXTENSIONS = (".pb", ".bin")
+# Suffix added to a text p4info file to get the path of its precompiled version
+P4INFO_SIDECAR_SUFFIX = ".bin"
+# Errors of load_p4info for files that are missing or can not be parsed
+P4INFO_LOAD_ERRORS = (
+    OSError,
+    google.protobuf.text_format.ParseError,
+    google.protobuf.message.DecodeError,
+)
+
+
+def load_p4info(p4_info_filepath):
+    """
+    Loads a p4info file into a P4Info object. Binary files (.pb/.bin) are parsed
+    directly. For text files, a precompiled binary sidecar (see compile_p4info) is
+    used instead when it is at least as new as the text file.
+
+    Args:
+        p4_info_filepath (str): Path to p4 info file
+
+    Returns:
+        P4Info: The loaded p4info
+    """
+    p4info = p4info_pb2.P4Info()
+
+    if p4_info_filepath.endswith(BINARY_P4INFO_EXTENSIONS):
+        with open(p4_info_filepath, "rb") as p4info_f:
+            p4info.ParseFromString(p4info_f.read())
+        return p4info
+
+    sidecar_path = p4_info_filepath + P4INFO_SIDECAR_SUFFIX
+    try:
+        sidecar_is_fresh = (
+            os.stat(sidecar_path).st_mtime_ns >= os.stat(p4_info_filepath).st_mtime_ns
+        )
+    except OSError:
+        sidecar_is_fresh = False
+
+    if sidecar_is_fresh:
+        try:
+            with open(sidecar_path, "rb") as p4info_f:
+                p4info.ParseFromString(p4info_f.read())
+            return p4info
+        except (OSError, google.protobuf.message.DecodeError):
+            # Broken sidecar, fall back to the text file
+            p4info.Clear()
+
+    # Load the p4info file into a skeleton P4Info object
+    with open(p4_info_filepath, "rb") as p4info_f:
+        data = p4info_f.read()
+    try:
+        text = data.decode("utf-8")
+    except UnicodeDecodeError:
+        # Binary p4info without a binary extension
+        p4info.ParseFromString(data)
+        return p4info
+
+    try:
+        google.protobuf.text_format.Merge(text, p4info)
+    except google.protobuf.text_format.ParseError as parse_error:
+        # A binary p4info can also be valid utf-8. If it is not binary either, the
+        # text parse error is the one that tells what is wrong.
+        p4info.Clear()
+        try:
+            p4info.ParseFromString(data)
+        except google.protobuf.message.DecodeError:
+            raise parse_error from None
+    return p4info
+
+
+def compile_p4info(p4_info_filepath, output_path=None):
+    """
+    Precompiles a text p4info file into a binary one. When no output path is given,
+    the binary is written as a sidecar next to the text file, where load_p4info
+    picks it up automatically for as long as it is newer than the text file.
+
+    Args:
+        p4_info_filepath (str): Path to text p4 info file
+        output_path (str, optional): Where to write the binary file. Defaults to the sidecar path.
+
+    Returns:
+        str: Path of the written binary file
+    """
+    if output_path is None:
+        output_path = p4_info_filepath + P4INFO_SIDECAR_SUFFIX
+
+    p4info = p4info_pb2.P4Info()
+    with open(p4_info_filepath) as p4info_f:
+        google.protobuf.text_format.Merge(p4info_f.read(), p4info)
+
+    # Write to a temporary file first so readers never see a partial sidecar
+    tmp_path = f"{output_path}.{os.getpid()}.tmp"
+    with open(tmp_path, "wb") as out_f:
+        out_f.write(p4info.SerializeToString())
+    os.replace(tmp_path, output_path)
+
+    return output_path
 
 
 class P4InfoHelper(object):
     def __init__(self, p4_info_filepath):
-        p4info = p4info_pb2.P4Info()
-        # Load the p4info file into a skeleton P4Info object
-        with open(p4_info_filepath) as p4info_f:
-            google.protobuf.text_format.Merge(p4info_f.read(), p4info)
-        self.p4info = p4info
+        self.p4info = load_p4info(p4_info_filepath)
+        self._schema = None
+        self._build_indexes()
+
+    def _build_indexes(self):
+        # Hash indexes for all lookups, built once so that compiling and validating
+        # large numbers of table entries does not rescan the p4info for every field
+        self._names = {}
+        self._ids = {}
+        for field in self.p4info.DESCRIPTOR.fields:
+            if field.message_type is None or field.label != field.LABEL_REPEATED:
+                continue
+            if "preamble" not in field.message_type.fields_by_name:
+                continue
+            names = {}
+            ids = {}
+            for o in getattr(self.p4info, field.name):
+                pre = o.preamble
+                # First match wins, same as a linear scan in declaration order
+                names.setdefault(pre.name, o)
+                names.setdefault(pre.alias, o)
+                ids.setdefault(pre.id, o)
+            self._names[field.name] = names
+            self._ids[field.name] = ids
+
+        self._match_fields = {}
+        for t in self.p4info.tables:
+            index = (
+                {mf.name: mf for mf in reversed(t.match_fields)},
+                {mf.id: mf for mf in reversed(t.match_fields)},
+            )
+            self._match_fields.setdefault(t.preamble.name, index)
+            self._match_fields.setdefault(t.preamble.alias, index)
+
+        self._action_params = {}
+        for a in self.p4info.actions:
+            index = (
+                {p.name: p for p in reversed(a.params)},
+                {p.id: p for p in reversed(a.params)},
+            )
+            self._action_params.setdefault(a.preamble.name, index)
+            self._action_params.setdefault(a.preamble.alias, index)
 
     def get(self, entity_type, name=None, id=None):
         if name is not None and id is not None:
             raise AssertionError("name or id must be None")
 
-        for o in getattr(self.p4info, entity_type):
-            pre = o.preamble
-            if name:
-                if pre.name == name or pre.alias == name:
-                    return o
-            else:
-                if pre.id == id:
-                    return o
+        if entity_type not in self._names:
+            # Unknown entity types raise the same way as a failed scan would
+            getattr(self.p4info, entity_type)
+
+        if name:
+            o = self._names.get(entity_type, {}).get(name)
+        else:
+            o = self._ids.get(entity_type, {}).get(id)
+        if o is not None:
+            return o
 
         if name:
             raise AttributeError("Could not find %r of type %s" % (name, entity_type))
@@ -60,31 +213,38 @@ class P4InfoHelper(object):
     def __getattr__(self, attr):
         # Synthesize convenience functions for name to id lookups for top-level entities
         # e.g. get_tables_id(name_string) or get_actions_id(name_string)
-        m = re.search("^get_(\w+)_id$", attr)
+        # The synthesized functions are cached on the instance, so the regex only
+        # runs on first use
+        m = _id_accessor_pattern.search(attr)
         if m:
             primitive = m.group(1)
-            return lambda name: self.get_id(primitive, name)
+            accessor = lambda name: self.get_id(primitive, name)
+            self.__dict__[attr] = accessor
+            return accessor
 
         # Synthesize convenience functions for id to name lookups
         # e.g. get_tables_name(id) or get_actions_name(id)
-        m = re.search("^get_(\w+)_name$", attr)
+        m = _name_accessor_pattern.search(attr)
         if m:
             primitive = m.group(1)
-            return lambda id: self.get_name(primitive, id)
+            accessor = lambda id: self.get_name(primitive, id)
+            self.__dict__[attr] = accessor
+            return accessor
 
         raise AttributeError("%r object has no attribute %r" % (self.__class__, attr))
 
     def get_match_field(self, table_name, name=None, id=None):
-        for t in self.p4info.tables:
-            pre = t.preamble
-            if pre.name == table_name:
-                for mf in t.match_fields:
-                    if name is not None:
-                        if mf.name == name:
-                            return mf
-                    elif id is not None:
-                        if mf.id == id:
-                            return mf
+        index = self._match_fields.get(table_name)
+        if index is not None:
+            by_name, by_id = index
+            if name is not None:
+                mf = by_name.get(name)
+            elif id is not None:
+                mf = by_id.get(id)
+            else:
+                mf = None
+            if mf is not None:
+                return mf
         raise AttributeError(
             "%r has no attribute %r" % (table_name, name if name is not None else id)
         )
@@ -136,19 +296,18 @@ class P4InfoHelper(object):
             raise Exception("Unsupported match type with type %r" % match_type)
 
     def get_action_param(self, action_name, name=None, id=None):
-        for a in self.p4info.actions:
-            pre = a.preamble
-            if pre.name == action_name:
-                for p in a.params:
-                    if name is not None:
-                        if p.name == name:
-                            return p
-                    elif id is not None:
-                        if p.id == id:
-                            return p
+        by_name, by_id = self._action_params.get(action_name, ({}, {}))
+        if name is not None:
+            p = by_name.get(name)
+        elif id is not None:
+            p = by_id.get(id)
+        else:
+            p = None
+        if p is not None:
+            return p
         raise AttributeError(
             "action %r has no param %r, (has: %r)"
-            % (action_name, name if name is not None else id, a.params)
+            % (action_name, name if name is not None else id, list(by_name))
         )
 
     def get_action_param_id(self, action_name, param_name):
@@ -183,7 +342,7 @@ class P4InfoHelper(object):
             table_entry.match.extend(
                 [
                     self.get_match_field_pb(table_name, match_field_name, value)
-                    for match_field_name, value in match_fields.iteritems()
+                    for match_field_name, value in match_fields.items()
                 ]
             )
 
@@ -197,7 +356,7 @@ class P4InfoHelper(object):
                 action.params.extend(
                     [
                         self.get_action_param_pb(action_name, field_name, value)
-                        for field_name, value in action_params.iteritems()
+                        for field_name, value in action_params.items()
                     ]
                 )
         return table_entry
@@ -239,8 +398,10 @@ class P4InfoHelper(object):
         table_list = []
 
         for o in getattr(self.p4info, "tables"):
-            mf = o.match_fields[0]
-            match_field = Match_Field(mf.id, mf.name, mf.bitwidth, mf.match_type)
+            match_fields = [
+                Match_Field(mf.id, mf.name, mf.bitwidth, mf.match_type)
+                for mf in o.match_fields
+            ]
             action_refs = []
 
             for ar in o.action_refs:
@@ -250,7 +411,7 @@ class P4InfoHelper(object):
                 o.preamble.id,
                 o.preamble.name,
                 o.preamble.alias,
-                match_field,
+                match_fields,
                 action_refs,
                 o.size,
             )
@@ -272,3 +433,90 @@ class P4InfoHelper(object):
             action_list.append(action)
 
         return action_list
+
+    def getSchema(self):
+        """
+        Returns the tables and actions of the program in a simple, indexed form.
+        Built on first use and shared by every caller of this helper.
+        """
+        if self._schema is None:
+            self._schema = P4Schema(self.getAllTables(), self.getAllActions())
+        return self._schema
+
+
+def get_p4info_helper(p4_info_filepath):
+    """
+    Returns a P4InfoHelper for the given p4info file, shared by all callers in the
+    process. Each distinct file is only parsed once as long as it is unchanged on
+    disk. Files are told apart by resolved path, mtime and size, and files with
+    identical content share one helper.
+
+    Args:
+        p4_info_filepath (str): Path to p4 info file
+
+    Returns:
+        P4InfoHelper: Helper for the file
+    """
+    path = os.path.realpath(p4_info_filepath)
+    st = os.stat(path)
+    stat_key = (path, st.st_mtime_ns, st.st_size)
+
+    with _p4info_cache_lock:
+        digest = _p4info_cache_by_stat.get(stat_key)
+        if digest is not None and digest in _p4info_cache_by_digest:
+            _p4info_cache_by_stat.move_to_end(stat_key)
+            _p4info_cache_by_digest.move_to_end(digest)
+            return _p4info_cache_by_digest[digest]
+
+    with open(path, "rb") as p4info_f:
+        digest = hashlib.sha1(p4info_f.read()).hexdigest()
+
+    with _p4info_cache_lock:
+        helper = _p4info_cache_by_digest.get(digest)
+    if helper is None:
+        helper = P4InfoHelper(path)
+
+    with _p4info_cache_lock:
+        _p4info_cache_by_stat[stat_key] = digest
+        _p4info_cache_by_stat.move_to_end(stat_key)
+        helper = _p4info_cache_by_digest.setdefault(digest, helper)
+        _p4info_cache_by_digest.move_to_end(digest)
+
+        while len(_p4info_cache_by_digest) > P4INFO_CACHE_SIZE:
+            _p4info_cache_by_digest.popitem(last=False)
+        while len(_p4info_cache_by_stat) > 4 * P4INFO_CACHE_SIZE:
+            _p4info_cache_by_stat.popitem(last=False)
+
+    return helper
+
+
+def clear_p4info_cache():
+    """
+    Drops all helpers cached by get_p4info_helper
+    """
+    with _p4info_cache_lock:
+        _p4info_cache_by_stat.clear()
+        _p4info_cache_by_digest.clear()
+
+
+def main():
+    import argparse
+
+    parser = argparse.ArgumentParser(
+        description="Precompile text p4info files into binary sidecars for faster loading"
+    )
+    parser.add_argument("p4info", nargs="+", help="Path to text p4 info file")
+    parser.add_argument(
+        "-o", "--output", help="Output path. Only valid for a single input file"
+    )
+    args = parser.parse_args()
+
+    if args.output and len(args.p4info) != 1:
+        parser.error("--output can only be used with a single p4 info file")
+
+    for path in args.p4info:
+        print(f"{path} -> {compile_p4info(path, args.output)}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,460 @@
+"""
+Generates shortest path ipv4 routes for all switches of a network setup.
+
+The switches and the links between them form a graph. A BFS from every switch with
+hosts attached finds, for every other switch, the ports that lead one hop closer to
+it. Every switch then gets one /32 LPM entry per reachable host, forwarding to the
+port of the host link or one of the equal cost next hop ports.
+
+Routes are added to the table entry store of each switch as columns of addresses,
+prefix lengths and ports, without creating a dict per entry.
+"""
+
+import gc
+from concurrent.futures import ProcessPoolExecutor
+from itertools import repeat
+
+from .allocators import int_to_ipv4, ipv4_to_int
+
+DEFAULT_TABLE_NAME = "Ingress.ipv4_lpm"
+DEFAULT_ACTION_NAME = "Ingress.ipv4_forward"
+DEFAULT_MATCH_FIELD = "hdr.ipv4.dst_addr"
+DEFAULT_PORT_PARAM = "egress_port"
+
+# Number of destination switches handled per task when using a process pool
+BFS_CHUNK_SIZE = 64
+
+
+class _Host(object):
+    def __init__(self, index, name, addr, ipv4_addr, switch, port) -> None:
+        self.index = index
+        self.name = name
+        # Address as int, used for ECMP hashing
+        self.addr = addr
+        self.ipv4_addr = ipv4_addr
+        # Index of the switch the host is attached to, and the port on the switch
+        self.switch = switch
+        self.port = port
+
+
+class RouteCompiler(object):
+    """
+    Computes routes from the link graph of a NetworkSetup. With ecmp, hosts behind
+    equal cost paths are spread over the next hops by their address (destination
+    mod k), otherwise the lowest port is always used. With ecmp_per_switch, all hosts
+    of a destination switch take the same next hop instead, which keeps their routes
+    mergeable by aggregate_switch_routes.
+    """
+
+    def __init__(self, network_setup, ecmp=True, ecmp_per_switch=False) -> None:
+        self.network_setup = network_setup
+        self.ecmp = ecmp
+        self.ecmp_per_switch = ecmp_per_switch
+
+        # Switches defined multiple times are only routed once
+        self.switch_names = []
+        switch_index = {}
+        for switch in network_setup.switches:
+            if switch.name not in switch_index:
+                switch_index[switch.name] = len(self.switch_names)
+                self.switch_names.append(switch.name)
+
+        # adjacency[switch] = [(neighbor switch, port on switch), ...]
+        self.adjacency = [[] for _ in self.switch_names]
+        self.hosts = []
+        attached = set()
+        for link in network_setup.links:
+            if link.conn_type == "Switch_to_Switch":
+                index1 = switch_index.get(link.device1)
+                index2 = switch_index.get(link.device2)
+                if index1 is None or index2 is None or index1 == index2:
+                    continue
+                self.adjacency[index1].append((index2, link.device1_port))
+                self.adjacency[index2].append((index1, link.device2_port))
+            elif link.conn_type == "Node_to_Switch":
+                # Hosts connected to several switches are routed to the first one
+                if link.device1 in attached:
+                    continue
+                index = switch_index.get(link.device2)
+                node = network_setup.get_node(link.device1)
+                if index is None or node is None:
+                    continue
+                try:
+                    addr = ipv4_to_int(node.ipv4_addr)
+                except (OSError, TypeError):
+                    continue
+                attached.add(link.device1)
+                self.hosts.append(
+                    _Host(
+                        len(self.hosts),
+                        node.name,
+                        addr,
+                        node.ipv4_addr,
+                        index,
+                        link.device2_port,
+                    )
+                )
+
+    def next_hops(self, processes=None):
+        """
+        Finds the next hop ports towards every switch with hosts
+
+        Args:
+            processes (int, optional): Number of worker processes. Defaults to None, which runs in this process.
+
+        Returns:
+            dict: destination switch index -> list with, for every switch, a tuple of the ports leading closer to the destination. Empty for the destination itself and for switches that can not reach it.
+        """
+        destinations = sorted({host.switch for host in self.hosts})
+        if not processes or processes <= 1 or len(destinations) <= BFS_CHUNK_SIZE:
+            return {d: _next_ports(self.adjacency, d) for d in destinations}
+
+        chunks = [
+            destinations[i : i + BFS_CHUNK_SIZE]
+            for i in range(0, len(destinations), BFS_CHUNK_SIZE)
+        ]
+        next_hops = {}
+        with ProcessPoolExecutor(
+            processes, initializer=_init_worker, initargs=(self.adjacency,)
+        ) as executor:
+            for chunk, results in zip(chunks, executor.map(_next_ports_chunk, chunks)):
+                next_hops.update(zip(chunk, results))
+        return next_hops
+
+    def iter_routes(self, processes=None):
+        """
+        Yields the routes of every switch
+
+        Args:
+            processes (int, optional): Number of worker processes for the BFS. Defaults to None.
+
+        Yields:
+            tuple: (switch name, [(host, egress port), ...])
+        """
+        next_hops = self.next_hops(processes)
+        ecmp = self.ecmp
+        hosts_by_switch = {}
+        for host in self.hosts:
+            hosts_by_switch.setdefault(host.switch, []).append(host)
+
+        for switch, name in enumerate(self.switch_names):
+            routes = []
+            for destination, hosts in hosts_by_switch.items():
+                if destination == switch:
+                    routes.extend((host, host.port) for host in hosts)
+                    continue
+                ports = next_hops[destination][switch]
+                if not ports:
+                    continue
+                if len(ports) == 1 or not ecmp:
+                    routes.extend(zip(hosts, repeat(ports[0])))
+                elif self.ecmp_per_switch:
+                    port = ports[destination % len(ports)]
+                    routes.extend(zip(hosts, repeat(port)))
+                else:
+                    routes.extend(
+                        (host, ports[host.addr % len(ports)]) for host in hosts
+                    )
+            yield name, routes
+
+
+def _next_ports(adjacency, destination):
+    # BFS from the destination, then collect for every switch the ports to
+    # neighbors one hop closer
+    dist = [-1] * len(adjacency)
+    dist[destination] = 0
+    frontier = [destination]
+    depth = 0
+    while frontier:
+        depth += 1
+        next_frontier = []
+        for switch in frontier:
+            for neighbor, _ in adjacency[switch]:
+                if dist[neighbor] < 0:
+                    dist[neighbor] = depth
+                    next_frontier.append(neighbor)
+        frontier = next_frontier
+
+    result = []
+    for switch, neighbors in enumerate(adjacency):
+        closer = dist[switch] - 1
+        if closer < 0:
+            result.append(())
+        else:
+            result.append(
+                tuple(sorted({port for n, port in neighbors if dist[n] == closer}))
+            )
+    return result
+
+
+_worker_adjacency = None
+
+
+def _init_worker(adjacency):
+    global _worker_adjacency
+    _worker_adjacency = adjacency
+
+
+def _next_ports_chunk(destinations):
+    return [_next_ports(_worker_adjacency, d) for d in destinations]
+
+
+def compile_routes(
+    network_setup,
+    table_name=DEFAULT_TABLE_NAME,
+    action_name=DEFAULT_ACTION_NAME,
+    match_field=DEFAULT_MATCH_FIELD,
+    port_param=DEFAULT_PORT_PARAM,
+    ecmp=True,
+    processes=None,
+    aggregate=False,
+):
+    """
+    Adds a /32 route to every reachable host to the table entries of every switch
+
+    Args:
+        network_setup (NetworkSetup): Setup to generate routes for
+        table_name (str, optional): LPM table of the routes. Defaults to "Ingress.ipv4_lpm".
+        action_name (str, optional): Forwarding action. Defaults to "Ingress.ipv4_forward".
+        match_field (str, optional): Destination address match field. Defaults to "hdr.ipv4.dst_addr".
+        port_param (str, optional): Egress port param of the action. Defaults to "egress_port".
+        ecmp (bool, optional): Spread hosts over equal cost next hops. Defaults to True.
+        processes (int, optional): Number of worker processes for the BFS. Defaults to None.
+        aggregate (bool, optional): Merge the routes of each switch into as few prefixes as possible, see aggregate_switch_routes. ECMP then spreads destination switches instead of hosts over the next hops. Defaults to False.
+
+    Returns:
+        int: Number of added table entries
+    """
+    compiler = RouteCompiler(network_setup, ecmp, ecmp_per_switch=aggregate)
+
+    # Example entry giving the names and kind of values of the route columns
+    example_match = {match_field: ["0.0.0.0", 32]}
+    example_params = {port_param: 0}
+
+    # Millions of route tuples would trigger the cyclic garbage collector over and
+    # over, none of them can be part of a cycle
+    gc_enabled = gc.isenabled()
+    gc.disable()
+    try:
+        count = 0
+        for switch_name, routes in compiler.iter_routes(processes):
+            switch = network_setup.get_switch(switch_name)
+            # The group sizes of the store tell without going through the entries,
+            # which can also be strings, see Switch.update_table
+            merged = aggregate and table_name not in switch.table_entries.table_counts()
+            if merged:
+                # Only new /32 routes in the table, merge them before adding them
+                prefixes = {}
+                for host, port in routes:
+                    prefixes.setdefault(host.addr, port)
+                routes = list(_merge_siblings(prefixes, 32))
+                columns = [list(column) for column in zip(*routes)] or [[], [], []]
+            else:
+                columns = [
+                    [host.addr for host, _ in routes],
+                    [32] * len(routes),
+                    [port for _, port in routes],
+                ]
+            switch.table_entries.add_columns(
+                table_name, action_name, example_match, example_params, columns
+            )
+            count += len(routes)
+            if aggregate and not merged:
+                before, after = aggregate_switch_routes(switch, table_name, match_field)
+                count -= before - after
+    finally:
+        if gc_enabled:
+            gc.enable()
+    return count
+
+
+# Marks a trie node with entries of different actions below it
+_MIXED = object()
+
+
+def aggregate_switch_routes(
+    switch, table_name=DEFAULT_TABLE_NAME, match_field=DEFAULT_MATCH_FIELD
+):
+    """
+    Replaces the ipv4 LPM entries of one table of a switch with the smallest set of
+    prefixes that forwards every address the same way. Sibling prefixes with the
+    same action and params are merged into their parent, and entries that are
+    covered by a shorter prefix with the same action are dropped. Addresses without
+    a route are never covered by the merged prefixes, so misses stay misses.
+
+    Only entries matching on nothing but match_field are merged, all other entries
+    are kept as they are.
+
+    Args:
+        switch (Switch): Switch to aggregate the routes of
+        table_name (str, optional): LPM table of the routes. Defaults to "Ingress.ipv4_lpm".
+        match_field (str, optional): Destination address match field. Defaults to "hdr.ipv4.dst_addr".
+
+    Returns:
+        tuple: (number of routes before, number of routes after)
+    """
+    # Binary trie stored by level: levels[prefix_len] = {prefix: node}, where a node
+    # is [own action key or None, full, action key of all entries below or _MIXED]
+    levels = [{} for _ in range(33)]
+    # Action key -> (action_name, action_params) of the first entry using it
+    actions = {}
+    kept = []
+    first_route = None
+    nr_of_routes = 0
+
+    for table_entry in switch.table_entries:
+        route = _parse_route(table_entry, table_name, match_field)
+        if route is None:
+            kept.append(table_entry)
+            continue
+        prefix, prefix_len, key = route
+        if first_route is None:
+            first_route = len(kept)
+        nr_of_routes += 1
+        actions.setdefault(
+            key, (table_entry["action_name"], table_entry["action_params"])
+        )
+        # Duplicates of a prefix would be rejected by the switch, the first one wins
+        levels[prefix_len].setdefault(prefix, [key, True, key])
+
+    if nr_of_routes == 0:
+        return 0, 0
+
+    used_lengths = [n for n in range(33) if levels[n]]
+    if len(used_lengths) == 1:
+        # Prefixes of one length never overlap, like the host routes of compile_routes
+        prefix_len = used_lengths[0]
+        routes = _merge_siblings(
+            {prefix: node[0] for prefix, node in levels[prefix_len].items()},
+            prefix_len,
+        )
+    else:
+        routes = _aggregate_trie(levels)
+
+    entries = []
+    for prefix, prefix_len, key in routes:
+        action_name, action_params = actions[key]
+        entries.append(
+            {
+                "table_name": table_name,
+                "action_name": action_name,
+                "match_fields": {match_field: [int_to_ipv4(prefix), prefix_len]},
+                "action_params": action_params,
+            }
+        )
+    kept[first_route:first_route] = entries
+    switch.table_entries = kept
+    return nr_of_routes, len(entries)
+
+
+def _aggregate_trie(levels):
+    # Aggregates overlapping prefixes, see aggregate_switch_routes for levels.
+    # Bottom up, fold every node into its parent.
+    for prefix_len in range(32, 0, -1):
+        parents = levels[prefix_len - 1]
+        bit = 1 << (32 - prefix_len)
+        for prefix, node in levels[prefix_len].items():
+            parent_prefix = prefix & ~bit
+            parent = parents.get(parent_prefix)
+            if parent is None:
+                # Full only if the sibling turns out to be full as well
+                sibling = levels[prefix_len].get(prefix ^ bit)
+                full = node[1] and sibling is not None and sibling[1]
+                parents[parent_prefix] = [None, full, node[2]]
+            else:
+                if parent[0] is None and not node[1]:
+                    parent[1] = False
+                if parent[2] is not node[2] and parent[2] != node[2]:
+                    parent[2] = _MIXED
+
+    # Top down, emit a single prefix for every full subtree with only one action.
+    # inherited is the action of the closest emitted shorter prefix, which LPM falls
+    # back to, so prefixes with the same action below it are not needed.
+    routes = []
+    stack = [(0, 0, None)]
+    while stack:
+        prefix, prefix_len, inherited = stack.pop()
+        own_key, full, key = levels[prefix_len][prefix]
+        if full and key is not _MIXED:
+            if key != inherited:
+                routes.append((prefix, prefix_len, key))
+            continue
+        if own_key is not None and own_key != inherited:
+            routes.append((prefix, prefix_len, own_key))
+            inherited = own_key
+        if prefix_len < 32:
+            children = levels[prefix_len + 1]
+            bit = 1 << (31 - prefix_len)
+            if prefix | bit in children:
+                stack.append((prefix | bit, prefix_len + 1, inherited))
+            if prefix in children:
+                stack.append((prefix, prefix_len + 1, inherited))
+    return routes
+
+
+def _merge_siblings(prefixes, prefix_len):
+    # Aggregates non overlapping prefixes of the same length. Siblings with the same
+    # action are merged into their parent level by level, everything else is final.
+    routes = []
+    while prefixes:
+        if prefix_len == 0:
+            routes.extend((prefix, 0, key) for prefix, key in prefixes.items())
+            break
+        bit = 1 << (32 - prefix_len)
+        parents = {}
+        for prefix, key in prefixes.items():
+            sibling = prefixes.get(prefix ^ bit)
+            if sibling is None or sibling != key:
+                routes.append((prefix, prefix_len, key))
+            elif not prefix & bit:
+                parents[prefix] = key
+        prefixes = parents
+        prefix_len -= 1
+    return routes
+
+
+def _parse_route(table_entry, table_name, match_field):
+    # (prefix as int, prefix length, action key), or None for entries that can not
+    # be merged
+    # Entries loaded with Switch.update_table are kept as strings
+    if not isinstance(table_entry, dict) or table_entry.get("table_name") != table_name:
+        return None
+    match_fields = table_entry.get("match_fields")
+    if type(match_fields) != dict or len(match_fields) != 1:
+        return None
+    value = match_fields.get(match_field)
+    if type(value) not in (list, tuple) or len(value) != 2:
+        return None
+    addr, prefix_len = value
+    if type(prefix_len) != int or not 0 <= prefix_len <= 32:
+        return None
+    try:
+        addr = ipv4_to_int(addr)
+        action_params = table_entry["action_params"]
+        key = (table_entry["action_name"], tuple(sorted(action_params.items())))
+        hash(key)
+    except (OSError, TypeError, AttributeError, KeyError):
+        return None
+    # Host bits are ignored by LPM
+    mask = (0xFFFFFFFF << (32 - prefix_len)) & 0xFFFFFFFF
+    return addr & mask, prefix_len, key
+
+
+def aggregate_routes(
+    network_setup, table_name=DEFAULT_TABLE_NAME, match_field=DEFAULT_MATCH_FIELD
+):
+    """
+    Aggregates the routes of all switches, see aggregate_switch_routes
+
+    Returns:
+        tuple: (number of routes before, number of routes after)
+    """
+    before = 0
+    after = 0
+    for switch in network_setup.switches:
+        switch_before, switch_after = aggregate_switch_routes(
+            switch, table_name, match_field
+        )
+        before += switch_before
+        after += switch_after
+    return before, after
@@ -29,3 +29,71 @@ class Action_Params(object):
         self.id = id
         self.name = name
         self.bitwidth = bitwidth
+
+
+class P4Schema(object):
+    """
+    Simple form of a p4 program with tables and actions indexed by name, alias
+    and id. Build it once per p4info with P4InfoHelper.getSchema and share it.
+    """
+
+    def __init__(self, tables, actions) -> None:
+        self.tables = tables
+        self.actions = actions
+
+        self.tables_by_name = {}
+        for table in tables:
+            self.tables_by_name.setdefault(table.name, table)
+            self.tables_by_name.setdefault(table.alias, table)
+
+        self.actions_by_name = {}
+        self.actions_by_id = {}
+        for action in actions:
+            self.actions_by_name.setdefault(action.name, action)
+            self.actions_by_name.setdefault(action.alias, action)
+            self.actions_by_id.setdefault(action.id, action)
+
+        self.action_params = {
+            action.id: {param.name: param for param in reversed(action.params)}
+            for action in actions
+        }
+
+        self.action_refs = {table.id: frozenset(table.action_refs) for table in tables}
+
+        # Table id -> TableValidator, compiled on first use
+        self._validators = {}
+
+    def get_table(self, name):
+        if not isinstance(name, str):
+            return None
+        return self.tables_by_name.get(name)
+
+    def get_action(self, name):
+        if not isinstance(name, str):
+            return None
+        return self.actions_by_name.get(name)
+
+    def get_action_param(self, action, name):
+        return self.action_params[action.id].get(name)
+
+    def get_table_actions(self, table):
+        return [
+            self.actions_by_id[ref]
+            for ref in table.action_refs
+            if ref in self.actions_by_id
+        ]
+
+    def get_validator(self, name):
+        """
+        Returns the compiled TableValidator of a table, or None if there is no table
+        with the given name or alias
+        """
+        table = self.get_table(name)
+        if table is None:
+            return None
+        validator = self._validators.get(table.id)
+        if validator is None:
+            from .validation import TableValidator
+
+            validator = self._validators[table.id] = TableValidator(table, self)
+        return validator
@@ -0,0 +1,194 @@
+"""
+Generators for common benchmark topologies. Every generator adds switches, hosts and
+links to a NetworkBuilder in bulk, with ipv4 addresses, MAC addresses, node ids and
+ports assigned automatically, and returns the builder.
+
+All switches run the same p4 program. Host names start with "h" and switch names with
+the role of the switch, e.g. "edge0_1".
+
+Example:
+    builder = fat_tree(4, "simple_switch", "p4info.pb.txt")
+    builder.save_setup_to_json("fat_tree.json")
+"""
+
+from .builder import NetworkBuilder
+
+
+def fat_tree(k, p4_prog_name="", p4_info_path="", hosts_per_edge=None, builder=None):
+    """
+    Builds a k-ary fat-tree: k pods with k/2 edge and k/2 aggregation switches each,
+    and (k/2)^2 core switches. Aggregation switch i of every pod connects to the core
+    switches core{i}_0 ... core{i}_{k/2-1}.
+
+    Args:
+        k (int): Number of ports per switch, must be even
+        p4_prog_name (str, optional): Name of the p4 program of the switches. Defaults to "".
+        p4_info_path (str, optional): Path to p4 info file of the switches. Defaults to "".
+        hosts_per_edge (int, optional): Hosts per edge switch. Defaults to k/2.
+        builder (NetworkBuilder, optional): Builder to add to. Defaults to a new one.
+
+    Returns:
+        NetworkBuilder: The builder holding the topology
+    """
+    if k < 2 or k % 2:
+        raise ValueError(f"Fat-tree k must be even and at least 2, got {k}")
+    half = k // 2
+    if hosts_per_edge is None:
+        hosts_per_edge = half
+
+    core = [f"core{i}_{j}" for i in range(half) for j in range(half)]
+    switches = list(core)
+    hosts = []
+    links = []
+    for pod in range(k):
+        aggs = [f"agg{pod}_{i}" for i in range(half)]
+        edges = [f"edge{pod}_{i}" for i in range(half)]
+        switches += aggs
+        switches += edges
+        for i, agg in enumerate(aggs):
+            for j in range(half):
+                links.append((agg, core[i * half + j]))
+            for edge in edges:
+                links.append((edge, agg))
+        for i, edge in enumerate(edges):
+            for j in range(hosts_per_edge):
+                host = f"h{pod}_{i}_{j}"
+                hosts.append(host)
+                links.append((host, edge))
+
+    return _build(builder, switches, hosts, links, p4_prog_name, p4_info_path)
+
+
+def leaf_spine(
+    leaves, spines, hosts_per_leaf=1, p4_prog_name="", p4_info_path="", builder=None
+):
+    """
+    Builds a two tier leaf-spine topology where every leaf connects to every spine
+
+    Args:
+        leaves (int): Number of leaf switches
+        spines (int): Number of spine switches
+        hosts_per_leaf (int, optional): Hosts per leaf switch. Defaults to 1.
+        p4_prog_name (str, optional): Name of the p4 program of the switches. Defaults to "".
+        p4_info_path (str, optional): Path to p4 info file of the switches. Defaults to "".
+        builder (NetworkBuilder, optional): Builder to add to. Defaults to a new one.
+
+    Returns:
+        NetworkBuilder: The builder holding the topology
+    """
+    spine_names = [f"spine{i}" for i in range(spines)]
+    leaf_names = [f"leaf{i}" for i in range(leaves)]
+
+    hosts = []
+    links = []
+    for i, leaf in enumerate(leaf_names):
+        for spine in spine_names:
+            links.append((leaf, spine))
+        for j in range(hosts_per_leaf):
+            host = f"h{i}_{j}"
+            hosts.append(host)
+            links.append((host, leaf))
+
+    return _build(
+        builder, spine_names + leaf_names, hosts, links, p4_prog_name, p4_info_path
+    )
+
+
+def linear(
+    switches, hosts_per_switch=1, p4_prog_name="", p4_info_path="", builder=None
+):
+    """
+    Builds a chain of switches s0 - s1 - ... with hosts on every switch
+
+    Args:
+        switches (int): Number of switches
+        hosts_per_switch (int, optional): Hosts per switch. Defaults to 1.
+        p4_prog_name (str, optional): Name of the p4 program of the switches. Defaults to "".
+        p4_info_path (str, optional): Path to p4 info file of the switches. Defaults to "".
+        builder (NetworkBuilder, optional): Builder to add to. Defaults to a new one.
+
+    Returns:
+        NetworkBuilder: The builder holding the topology
+    """
+    names = [f"s{i}" for i in range(switches)]
+    links = list(zip(names, names[1:]))
+    hosts = _attach_hosts(names, hosts_per_switch, links)
+    return _build(builder, names, hosts, links, p4_prog_name, p4_info_path)
+
+
+def ring(switches, hosts_per_switch=1, p4_prog_name="", p4_info_path="", builder=None):
+    """
+    Builds a ring of switches where the last switch connects back to the first
+
+    Args:
+        switches (int): Number of switches
+        hosts_per_switch (int, optional): Hosts per switch. Defaults to 1.
+        p4_prog_name (str, optional): Name of the p4 program of the switches. Defaults to "".
+        p4_info_path (str, optional): Path to p4 info file of the switches. Defaults to "".
+        builder (NetworkBuilder, optional): Builder to add to. Defaults to a new one.
+
+    Returns:
+        NetworkBuilder: The builder holding the topology
+    """
+    names = [f"s{i}" for i in range(switches)]
+    links = list(zip(names, names[1:]))
+    # Two switches are already connected by the chain
+    if switches > 2:
+        links.append((names[-1], names[0]))
+    hosts = _attach_hosts(names, hosts_per_switch, links)
+    return _build(builder, names, hosts, links, p4_prog_name, p4_info_path)
+
+
+def torus(
+    rows, columns, hosts_per_switch=1, p4_prog_name="", p4_info_path="", builder=None
+):
+    """
+    Builds a two dimensional torus, a grid of switches s{row}_{column} where every
+    row and column wraps around
+
+    Args:
+        rows (int): Number of rows
+        columns (int): Number of columns
+        hosts_per_switch (int, optional): Hosts per switch. Defaults to 1.
+        p4_prog_name (str, optional): Name of the p4 program of the switches. Defaults to "".
+        p4_info_path (str, optional): Path to p4 info file of the switches. Defaults to "".
+        builder (NetworkBuilder, optional): Builder to add to. Defaults to a new one.
+
+    Returns:
+        NetworkBuilder: The builder holding the topology
+    """
+    grid = [[f"s{r}_{c}" for c in range(columns)] for r in range(rows)]
+
+    links = []
+    for r in range(rows):
+        for c in range(columns):
+            # Wrapping links are skipped when they would duplicate a grid link
+            if c + 1 < columns or columns > 2:
+                links.append((grid[r][c], grid[r][(c + 1) % columns]))
+            if r + 1 < rows or rows > 2:
+                links.append((grid[r][c], grid[(r + 1) % rows][c]))
+
+    names = [name for row in grid for name in row]
+    hosts = _attach_hosts(names, hosts_per_switch, links)
+    return _build(builder, names, hosts, links, p4_prog_name, p4_info_path)
+
+
+def _attach_hosts(switch_names, hosts_per_switch, links):
+    # Adds hosts h{switch index}_{i} on every switch, returns the host names
+    hosts = []
+    for i, switch in enumerate(switch_names):
+        for j in range(hosts_per_switch):
+            host = f"h{i}_{j}"
+            hosts.append(host)
+            links.append((host, switch))
+    return hosts
+
+
+def _build(builder, switches, hosts, links, p4_prog_name, p4_info_path):
+    if builder is None:
+        builder = NetworkBuilder()
+
+    builder.add_switches((name, p4_prog_name, p4_info_path) for name in switches)
+    builder.add_nodes((name,) for name in hosts)
+    builder.add_links(links)
+    return builder
@@ -0,0 +1,1024 @@
+"""
+Compiled validation of table entries against a p4 program.
+
+A TableValidator is built once per table of a P4Schema, see P4Schema.get_validator.
+It holds every match field of the table with its bitwidth and match type, and the
+actions the table can use with their params, so a whole table entry is checked in
+one pass without any lookups in the p4info.
+
+Values are interpreted the same way as convert.encode does when the entries are
+sent to a switch: ints, MAC and ipv4 address strings, and strings or bytes that are
+already encoded.
+
+Problems are collected as ValidationIssue records in a ValidationResult, which can
+be printed, summarized or exported to json.
+"""
+
+import json
+import socket
+import struct
+import sys
+from collections import Counter, deque
+from concurrent.futures import ProcessPoolExecutor
+from functools import lru_cache
+
+try:
+    import numpy as np
+except ImportError:  # numpy is only needed for find_invalid_entries
+    np = None
+
+from .convert import bitwidthToBytes, matchesIPv4, matchesMac
+from .entry_store import TableEntryStore
+from .p4_helper import get_p4info_helper, P4INFO_LOAD_ERRORS
+
+# Match types of p4info MatchField
+MATCH_EXACT = 2
+MATCH_LPM = 3
+MATCH_TERNARY = 4
+MATCH_RANGE = 5
+MATCH_OPTIONAL = 6
+
+MATCH_TYPE_NAMES = {
+    MATCH_EXACT: "exact",
+    MATCH_LPM: "lpm",
+    MATCH_TERNARY: "ternary",
+    MATCH_RANGE: "range",
+    MATCH_OPTIONAL: "optional",
+}
+
+# Number of table entries checked per task when using a process pool
+VALIDATION_CHUNK_SIZE = 1 << 16
+# Shards per worker process submitted ahead of the results
+SHARDS_IN_FLIGHT = 2
+
+# Severities of validation issues. Only errors make a setup invalid.
+SEVERITY_ERROR = "error"
+SEVERITY_WARNING = "warning"
+SEVERITY_INFO = "info"
+
+# Codes of validation issues of the setup
+DUPLICATE_NODE = "duplicate-node"
+NODE_NOT_CONNECTED = "node-not-connected"
+DUPLICATE_SWITCH = "duplicate-switch"
+SWITCH_NAME_USED_BY_NODE = "switch-name-used-by-node"
+SWITCH_NOT_CONNECTED = "switch-not-connected"
+INVALID_SERVER_PORT = "invalid-server-port"
+SERVER_PORT_IN_USE = "server-port-in-use"
+INVALID_LINK = "invalid-link"
+UNDEFINED_LINK_DEVICE = "undefined-link-device"
+PORT_IN_USE = "port-in-use"
+NO_P4_INFO = "no-p4-info"
+TABLE_TOO_LARGE = "table-too-large"
+# Codes of validation issues of table entries
+INVALID_ENTRY = "invalid-entry"
+UNKNOWN_TABLE = "unknown-table"
+INVALID_MATCH_FIELDS = "invalid-match-fields"
+UNKNOWN_MATCH_FIELD = "unknown-match-field"
+INVALID_MATCH_VALUE = "invalid-match-value"
+MISSING_MATCH_FIELD = "missing-match-field"
+UNKNOWN_ACTION = "unknown-action"
+INVALID_ACTION_PARAMS = "invalid-action-params"
+UNKNOWN_ACTION_PARAM = "unknown-action-param"
+INVALID_PARAM_VALUE = "invalid-param-value"
+MISSING_ACTION_PARAM = "missing-action-param"
+
+_unpack_ipv4 = struct.Struct("!I").unpack
+
+
+def value_to_int(value, bitwidth):
+    """
+    Converts a match field or action param value to the unsigned int it is encoded
+    as, see convert.encode
+
+    Args:
+        value: int, MAC or ipv4 address string, or already encoded str or bytes
+        bitwidth (int): Bitwidth of the field
+
+    Returns:
+        int: The value, or None if the value can not be encoded
+    """
+    value_type = type(value)
+    if value_type is int:
+        return value
+    byte_len = bitwidthToBytes(bitwidth)
+    if value_type is str:
+        if matchesMac(value):
+            if byte_len != 6:
+                return None
+            return int(value.replace(":", ""), 16)
+        if matchesIPv4(value):
+            if byte_len != 4:
+                return None
+            try:
+                return _unpack_ipv4(socket.inet_pton(socket.AF_INET, value))[0]
+            except OSError:
+                return None
+        try:
+            value = value.encode("latin-1")
+        except UnicodeEncodeError:
+            return None
+    elif value_type is not bytes:
+        return None
+    if len(value) != byte_len:
+        return None
+    return int.from_bytes(value, "big")
+
+
+class ValidationIssue(object):
+    """
+    One problem found by a check. Device, table and index are None when they do
+    not apply, index is the position of a table entry in the entries of its switch.
+    """
+
+    __slots__ = ("code", "severity", "message", "device", "table", "index", "hint")
+
+    def __init__(
+        self,
+        code,
+        message,
+        device=None,
+        table=None,
+        index=None,
+        hint=None,
+        severity=SEVERITY_ERROR,
+    ) -> None:
+        self.code = code
+        self.severity = severity
+        self.message = message
+        self.device = device
+        self.table = table
+        self.index = index
+        self.hint = hint
+
+    def to_dict(self):
+        return {name: getattr(self, name) for name in self.__slots__}
+
+    def __str__(self):
+        text = self.message
+        if self.index is not None:
+            text = f"Switch {self.device} entry {self.index}: {text}"
+        if self.hint:
+            text = f"{text}. {self.hint}"
+        return text
+
+    def __repr__(self):
+        return f"ValidationIssue({self.code!r}, {str(self)!r})"
+
+
+class ValidationResult(object):
+    """
+    Issues found by a check. Nothing is printed while checking, see print. With
+    max_errors, checks stop looking for more once that many errors are found and
+    truncated is set.
+    """
+
+    def __init__(self, max_errors=None) -> None:
+        self.max_errors = max_errors
+        self.issues = []
+        self.error_count = 0
+        self.truncated = False
+
+    @property
+    def has_errors(self):
+        return self.error_count > 0
+
+    @property
+    def full(self):
+        """
+        True when max_errors errors have been found and checks should stop
+        """
+        return self.max_errors is not None and self.error_count >= self.max_errors
+
+    @property
+    def remaining(self):
+        """
+        Number of errors that can still be added, None if there is no limit
+        """
+        if self.max_errors is None:
+            return None
+        return max(self.max_errors - self.error_count, 0)
+
+    def add(
+        self,
+        code,
+        message,
+        device=None,
+        table=None,
+        index=None,
+        hint=None,
+        severity=SEVERITY_ERROR,
+    ):
+        """
+        Adds an issue, see ValidationIssue
+
+        Returns:
+            bool: False if the issue was dropped because of max_errors
+        """
+        return self.add_issue(
+            ValidationIssue(code, message, device, table, index, hint, severity)
+        )
+
+    def add_issue(self, issue):
+        """
+        Adds a ValidationIssue
+
+        Returns:
+            bool: False if the issue was dropped because of max_errors
+        """
+        if issue.severity == SEVERITY_ERROR:
+            if self.full:
+                self.truncated = True
+                return False
+            self.error_count += 1
+            if self.full:
+                self.truncated = True
+        self.issues.append(issue)
+        return True
+
+    def errors(self):
+        return [issue for issue in self.issues if issue.severity == SEVERITY_ERROR]
+
+    def summary(self):
+        """
+        Number of issues per severity and per code
+
+        Returns:
+            dict: {"errors": int, "warnings": int, "info": int, "truncated": bool, "codes": {code: int}}
+        """
+        severities = Counter(issue.severity for issue in self.issues)
+        return {
+            "errors": severities[SEVERITY_ERROR],
+            "warnings": severities[SEVERITY_WARNING],
+            "info": severities[SEVERITY_INFO],
+            "truncated": self.truncated,
+            "codes": dict(Counter(issue.code for issue in self.issues)),
+        }
+
+    def to_dict(self):
+        return {
+            "summary": self.summary(),
+            "issues": [issue.to_dict() for issue in self.issues],
+        }
+
+    def to_json(self, indent=None):
+        return json.dumps(self.to_dict(), indent=indent)
+
+    def save_json(self, path, indent=4):
+        """
+        Saves the summary and all issues to a json file
+        """
+        with open(path, "w") as f:
+            json.dump(self.to_dict(), f, indent=indent)
+
+    def print(self, file=None, min_severity=SEVERITY_INFO):
+        """
+        Prints every issue and the number of errors
+
+        Args:
+            file (optional): Where to print. Defaults to sys.stdout.
+            min_severity (str, optional): Skip issues below this severity. Defaults to SEVERITY_INFO.
+        """
+        if file is None:
+            file = sys.stdout
+        shown = _SEVERITY_ORDER[min_severity]
+        lines = [
+            str(issue)
+            for issue in self.issues
+            if _SEVERITY_ORDER[issue.severity] >= shown
+        ]
+        if self.error_count:
+            lines.append(f"{self} Check above on how to fix them")
+        if lines:
+            print("\n".join(lines), file=file)
+
+    def __str__(self):
+        text = f"{self.error_count} errors"
+        if self.truncated:
+            text += f", stopped after max_errors={self.max_errors}"
+        return text + "."
+
+    def __repr__(self):
+        return f"ValidationResult({str(self)!r})"
+
+
+_SEVERITY_ORDER = {SEVERITY_INFO: 0, SEVERITY_WARNING: 1, SEVERITY_ERROR: 2}
+
+
+def check_table_entry(schema, table_entry):
+    """
+    Checks a table entry on json format against the compiled validator of its table
+
+    Args:
+        schema (P4Schema): Schema of the p4 program of the switch
+        table_entry (dict): Table entry to check
+
+    Returns:
+        list: ValidationIssue of every error, empty if the entry is valid
+    """
+    if not isinstance(table_entry, dict):
+        return [
+            ValidationIssue(
+                INVALID_ENTRY, f"Table entry should be a dict, got {table_entry!r}"
+            )
+        ]
+
+    table_name = table_entry.get("table_name")
+    if type(table_name) != str:
+        return [ValidationIssue(INVALID_ENTRY, "Table name should be a string")]
+
+    validator = schema.get_validator(table_name)
+    if validator is None:
+        table_names = ", ".join(table.name for table in schema.tables)
+        return [
+            ValidationIssue(
+                UNKNOWN_TABLE,
+                f"Table with name {table_name or None} could not be found in p4 info file",
+                table=table_name,
+                hint=f"Available tables: {table_names}",
+            )
+        ]
+
+    return validator.check(
+        table_entry.get("match_fields"),
+        table_entry.get("action_name"),
+        table_entry.get("action_params"),
+    )
+
+
+def find_entry_errors(
+    switches, processes=None, chunk_size=VALIDATION_CHUNK_SIZE, max_errors=None
+):
+    """
+    Checks the table entries of all switches with a p4 info file. With processes,
+    the entries are split into shards of at most chunk_size entries of one switch
+    and checked in a process pool. Every worker gets the parsed schemas once, so
+    the p4 info files are never parsed again in the workers.
+
+    Args:
+        switches (list): Switches to check
+        processes (int, optional): Number of worker processes. Defaults to None, which checks in this process.
+        chunk_size (int, optional): Max number of entries per shard. Defaults to VALIDATION_CHUNK_SIZE.
+        max_errors (int, optional): Stop checking after this many errors. Defaults to None.
+
+    Returns:
+        ValidationResult: Every error, sorted by switch name and entry index
+    """
+    result = ValidationResult(max_errors)
+    EntryChecker().check(switches, result, processes, chunk_size)
+    return result
+
+
+def load_schemas(switches, result):
+    """
+    Loads the p4 info file of every switch that has one, once per path. A switch
+    whose file can not be loaded gets a NO_P4_INFO error in result, and should be
+    skipped by the checks that need its schema.
+
+    Args:
+        switches (list): Switches to load the p4 info files of
+        result (ValidationResult): Result to add the load errors to
+
+    Returns:
+        dict: p4 info path -> P4Schema of every path that could be loaded
+    """
+    schemas = {}
+    failed = {}
+    for switch in switches:
+        path = switch.p4_info_path
+        if not path or path in schemas:
+            continue
+        if path not in failed:
+            try:
+                schemas[path] = get_p4info_helper(path).getSchema()
+                continue
+            except P4INFO_LOAD_ERRORS as e:
+                failed[path] = str(e).rstrip(".")
+        result.add(
+            NO_P4_INFO,
+            f"Switch {switch.name} p4 info file could not be loaded: {failed[path]}",
+            switch.name,
+            hint=f"p4 info path: {path}",
+        )
+    return schemas
+
+
+class EntryChecker(object):
+    """
+    Finds the errors in the table entries of switches, like find_entry_errors, but
+    remembers what it has checked. The next call only checks entries added since,
+    as long as the entries of a switch have not been replaced or removed (see
+    TableEntryStore.version) and its p4 info file is unchanged. Errors of entries
+    checked before are reported again without checking them.
+    """
+
+    def __init__(self) -> None:
+        # id(switch) -> _SwitchEntries
+        self._checked = {}
+
+    def forget(self, switch):
+        """
+        Drops what has been checked of a switch, so all its entries are checked again
+        """
+        self._checked.pop(id(switch), None)
+
+    def check(
+        self,
+        switches,
+        result,
+        processes=None,
+        chunk_size=VALIDATION_CHUNK_SIZE,
+        schemas=None,
+    ):
+        """
+        Adds the errors in the table entries of switches to result, sorted by switch
+        name and entry index. Stops checking once result is full, the entries left
+        unchecked are checked by the next call. See find_entry_errors.
+
+        Args:
+            schemas (dict, optional): Schemas from load_schemas. Defaults to None, which loads them and adds the load errors to result.
+        """
+        if schemas is None:
+            schemas = load_schemas(switches, result)
+        parallel = processes is not None and processes > 1
+        checked = {}
+        shards = []
+        for position, switch in enumerate(switches):
+            # Switches whose p4 info file could not be loaded are skipped
+            schema = schemas.get(switch.p4_info_path)
+            if schema is None:
+                continue
+
+            state = self._checked.get(id(switch))
+            table_entries = switch.table_entries
+            if state is None or not state.matches(switch, schema):
+                state = _SwitchEntries(switch, schema)
+            state.position = position
+            checked[id(switch)] = state
+
+            # Only the process pool needs the entries of a switch split up
+            count = len(table_entries)
+            step = chunk_size if parallel else max(count, 1)
+            for start in range(state.count, count, step):
+                shards.append((state, start, min(start + step, count)))
+        self._checked = checked
+
+        # Errors found before count towards max_errors
+        limit = result.remaining
+        if limit is not None:
+            limit -= sum(len(state.errors) for state in checked.values())
+
+        if limit is None or limit > 0:
+            if parallel and shards:
+                self._check_parallel(shards, schemas, processes, limit)
+            else:
+                for state, start, _ in shards:
+                    checked_count, errors = _check_entries(
+                        state.schema, state.table_entries, start, limit=limit
+                    )
+                    state.add_errors(start + checked_count, errors)
+                    if limit is not None:
+                        limit -= len(errors)
+                        if limit <= 0:
+                            break
+
+        found = [
+            (state.switch.name, state.position, issue)
+            for state in checked.values()
+            for issue in state.errors
+        ]
+        # Stable, so the errors of one entry stay in the order they were found
+        found.sort(key=lambda error: (error[0], error[1], error[2].index))
+        for _, _, issue in found:
+            if not result.add_issue(issue):
+                break
+
+    def _check_parallel(self, shards, schemas, processes, limit):
+        # Shards are copied out of their store only when they are submitted, with a
+        # few per worker in flight, so the entries are never all held twice
+        shards = iter(shards)
+        in_flight = deque()
+
+        def submit(executor):
+            shard = next(shards, None)
+            if shard is not None:
+                state, start, stop = shard
+                task = (
+                    state.switch.p4_info_path,
+                    start,
+                    state.switch.table_entries.copy_range(start, stop),
+                )
+                in_flight.append((state, stop, executor.submit(_check_shard, task)))
+
+        with ProcessPoolExecutor(
+            processes, initializer=_init_worker, initargs=(schemas,)
+        ) as executor:
+            for _ in range(SHARDS_IN_FLIGHT * processes):
+                submit(executor)
+            # Results are taken in shard order, so the entries of a switch are
+            # checked without gaps when stopping early
+            while in_flight:
+                state, stop, future = in_flight.popleft()
+                _, errors = future.result()
+                state.add_errors(stop, errors)
+                if limit is not None:
+                    limit -= len(errors)
+                    if limit <= 0:
+                        for _, _, pending in in_flight:
+                            pending.cancel()
+                        break
+                submit(executor)
+
+
+class _SwitchEntries(object):
+    # What has been checked of the entries of a switch
+    def __init__(self, switch, schema) -> None:
+        self.switch = switch
+        self.schema = schema
+        self.table_entries = switch.table_entries
+        self.version = switch.table_entries.version
+        self.position = 0
+        # Number of entries checked and the issues of their errors
+        self.count = 0
+        self.errors = []
+
+    def matches(self, switch, schema):
+        table_entries = switch.table_entries
+        return (
+            switch is self.switch
+            and schema is self.schema
+            and table_entries is self.table_entries
+            and table_entries.version == self.version
+            and len(table_entries) >= self.count
+        )
+
+    def add_errors(self, count, errors):
+        # Shards of a switch are added in order, so the errors stay sorted by index
+        name = self.switch.name
+        for issue in errors:
+            issue.device = name
+        self.errors.extend(errors)
+        self.count = count
+
+
+_worker_schemas = None
+
+
+def _init_worker(schemas):
+    global _worker_schemas
+    _worker_schemas = schemas
+
+
+def _check_shard(shard):
+    path, start, table_entries = shard
+    return _check_entries(_worker_schemas[path], table_entries, offset=start)
+
+
+def _check_entries(schema, table_entries, start=0, offset=0, limit=None):
+    # Number of entries checked from start on and the issues of their errors, with
+    # offset added to the entry indices. Stops after the entry where the number of
+    # errors reaches limit. Only entries find_invalid_entries flags are checked
+    # one by one.
+    count = len(table_entries)
+    indices = None
+    if np is not None and isinstance(table_entries, TableEntryStore):
+        indices = find_invalid_entries(schema, table_entries, start)
+    if indices is None:
+        indices = range(start, count)
+
+    errors = []
+    for index in indices:
+        issues = check_table_entry(schema, table_entries[index])
+        if issues:
+            for issue in issues:
+                issue.index = index + offset
+            errors.extend(issues)
+            if limit is not None and len(errors) >= limit:
+                return index + 1 - start, errors
+    return count - start, errors
+
+
+def find_invalid_entries(schema, table_entries, start=0, stop=None):
+    """
+    Finds the entries of a TableEntryStore that may be invalid, without creating the
+    entry dicts. For every group of entries with the same table, action and names
+    (see TableEntryStore.column_groups), the names are checked once, and the values
+    of each match field and action param are checked together as NumPy arrays:
+    that they fit the bitwidth, that LPM prefix lengths are within the bitwidth and
+    have no host bits set, that ternary values are within their masks and that range
+    bounds are in order.
+
+    Every entry check_table_entry reports is returned. A few valid entries may be
+    returned too, e.g. when values of a group can not be checked as arrays, so
+    check the returned entries with check_table_entry for the error messages.
+
+    Args:
+        schema (P4Schema): Schema of the p4 program of the switch
+        table_entries (TableEntryStore): Entries to check
+        start (int, optional): First entry to check. Defaults to 0.
+        stop (int, optional): Stop before this entry. Defaults to None, the end.
+
+    Returns:
+        list: Sorted indices of the entries that may be invalid, None without NumPy
+    """
+    if np is None:
+        return None
+
+    found = []
+    for columns in table_entries.column_groups(start, stop):
+        invalid = _invalid_rows(schema, columns)
+        if invalid is None:
+            found.extend(columns.entry_indices())
+        elif invalid.any():
+            found.extend(columns.entry_indices(np.flatnonzero(invalid)))
+    found.sort()
+    return found
+
+
+def _invalid_rows(schema, columns):
+    # Bool array of the rows of the group that may be invalid, None if all of them
+    # may be
+    if columns.generic:
+        return None
+    validator = schema.get_validator(columns.table_name)
+    if validator is None:
+        return None
+    action = validator.actions.get(columns.action_name)
+    if (
+        action is None
+        or not columns.match_fields.keys() <= validator.match_fields.keys()
+        or any(name not in columns.match_fields for name in validator.required)
+        or columns.action_params.keys() != action.params.keys()
+    ):
+        return None
+
+    rows = slice(columns.start_row, columns.stop_row)
+    invalid = np.zeros(len(columns), dtype=bool)
+    for name, (codec, column) in columns.match_fields.items():
+        field = validator.match_fields[name]
+        field_invalid = _invalid_match_values(field, codec, column, rows, columns)
+        if field_invalid is None:
+            return None
+        invalid |= field_invalid
+    for name, (codec, column) in columns.action_params.items():
+        _, param_invalid = _column_ints(
+            codec, column, rows, action.params[name], columns.strings
+        )
+        invalid |= param_invalid
+    return invalid
+
+
+def _invalid_match_values(field, codec, column, rows, columns):
+    match_type = field.match_type
+    bitwidth = field.bitwidth
+    pair = type(codec) is tuple
+
+    if match_type in (MATCH_EXACT, MATCH_OPTIONAL):
+        if pair:
+            return None
+        _, invalid = _column_ints(codec, column, rows, bitwidth, columns.strings)
+        return invalid
+
+    if not pair or match_type not in (MATCH_LPM, MATCH_TERNARY, MATCH_RANGE):
+        return None
+    first, invalid = _column_ints(codec[0], column[0], rows, bitwidth, columns.strings)
+    if first is None:
+        return None
+
+    if match_type == MATCH_LPM:
+        if codec[1] != "i":
+            return None
+        prefix_len = _column_array(column[1], rows)
+        invalid |= (prefix_len < 0) | (prefix_len > bitwidth)
+        # Host bits below the prefix, shifts are kept within 64 bits
+        host_bits = np.clip(bitwidth - prefix_len, 0, 64).astype(np.uint64)
+        low_mask = np.where(
+            host_bits >= 64,
+            np.uint64(0xFFFFFFFFFFFFFFFF),
+            (np.uint64(1) << np.minimum(host_bits, 63)) - np.uint64(1),
+        )
+        invalid |= (first & low_mask) != 0
+        return invalid
+
+    second, second_invalid = _column_ints(
+        codec[1], column[1], rows, bitwidth, columns.strings
+    )
+    if second is None:
+        return None
+    invalid |= second_invalid
+    if match_type == MATCH_TERNARY:
+        invalid |= (first & ~second) != 0
+    else:
+        invalid |= first > second
+    return invalid
+
+
+def _column_ints(codec, column, rows, bitwidth, strings):
+    # The values of a column in rows as a uint64 array, and a bool array of the
+    # values that can not be encoded in bitwidth bits, see value_to_int. The values
+    # are None if they do not fit in 64 bits.
+    values = _column_array(column, rows)
+    if codec == "i":
+        invalid = values < 0
+        if bitwidth < 63:
+            invalid |= values >= 1 << bitwidth
+        return values.astype(np.uint64), invalid
+
+    if codec in ("4", "m"):
+        # Addresses are only encoded for fields of their own size
+        if bitwidthToBytes(bitwidth) != (4 if codec == "4" else 6):
+            return None, np.ones(len(values), dtype=bool)
+        values = values.astype(np.uint64)
+        invalid = np.zeros(len(values), dtype=bool)
+        if bitwidth < 64:
+            invalid = values >= np.uint64(1 << bitwidth)
+        return values, invalid
+
+    # String ids, each distinct string is converted once
+    ids, inverse = np.unique(values, return_inverse=True)
+    ints = [_cached_value_to_int(strings[string_id], bitwidth) for string_id in ids]
+    unique_invalid = np.array(
+        [value is None or value >= 1 << bitwidth for value in ints], dtype=bool
+    )
+    invalid = unique_invalid[inverse]
+    if bitwidth > 64:
+        return None, invalid
+    unique_values = np.array(
+        [0 if value is None else value for value in ints], dtype=np.uint64
+    )
+    return unique_values[inverse], invalid
+
+
+def _column_array(column, rows):
+    # NumPy view of the rows of an array column, without copying
+    return np.frombuffer(column, dtype=column.typecode)[rows]
+
+
+class _MatchFieldCheck(object):
+    def __init__(self, name, bitwidth, match_type) -> None:
+        self.name = name
+        self.bitwidth = bitwidth
+        self.match_type = match_type
+        self.limit = 1 << bitwidth
+        self.type_name = MATCH_TYPE_NAMES.get(match_type, str(match_type))
+
+
+class _ActionCheck(object):
+    def __init__(self, action) -> None:
+        self.name = action.name
+        # Param name -> bitwidth
+        self.params = {}
+        for param in action.params:
+            self.params.setdefault(param.name, param.bitwidth)
+        self.hint = _param_hint(self.params)
+
+
+class TableValidator(object):
+    """
+    Checks table entries of one table. Exact match fields must be given, the other
+    match types may be left out to match anything, like in P4Runtime.
+    """
+
+    def __init__(self, table, schema) -> None:
+        self.table = table
+        self.match_fields = {}
+        for mf in table.match_fields:
+            self.match_fields.setdefault(
+                mf.name, _MatchFieldCheck(mf.name, mf.bitwidth, mf.match_type)
+            )
+        self.required = [
+            name
+            for name, field in self.match_fields.items()
+            if field.match_type == MATCH_EXACT
+        ]
+        # Action name and alias -> check, only for actions of the table
+        self.actions = {}
+        for action in schema.get_table_actions(table):
+            check = _ActionCheck(action)
+            self.actions.setdefault(action.name, check)
+            self.actions.setdefault(action.alias, check)
+        # Hints are built once, so reporting many errors stays cheap
+        self.match_field_hint = self._match_field_hint()
+        self.action_hint = self._action_hint()
+
+    def check(self, match_fields, action_name, action_params):
+        """
+        Checks the match fields and action of a table entry
+
+        Returns:
+            list: ValidationIssue of every error, empty if the entry is valid
+        """
+        errors = []
+        table_name = self.table.name
+
+        if not isinstance(match_fields, dict):
+            errors.append(
+                ValidationIssue(
+                    INVALID_MATCH_FIELDS,
+                    f"Match fields of table {table_name} should be a dict, got {type(match_fields).__name__}",
+                    table=table_name,
+                    hint=self.match_field_hint,
+                )
+            )
+        else:
+            for name, value in match_fields.items():
+                field = self.match_fields.get(name)
+                if field is None:
+                    errors.append(
+                        ValidationIssue(
+                            UNKNOWN_MATCH_FIELD,
+                            f"Table {table_name} has no match field {name}",
+                            table=table_name,
+                            hint=self.match_field_hint,
+                        )
+                    )
+                    continue
+                error = _check_match_value(field, value)
+                if error:
+                    errors.append(
+                        ValidationIssue(
+                            INVALID_MATCH_VALUE,
+                            f"Match field {name}: {error}",
+                            table=table_name,
+                        )
+                    )
+            for name in self.required:
+                if name not in match_fields:
+                    errors.append(
+                        ValidationIssue(
+                            MISSING_MATCH_FIELD,
+                            f"Exact match field {name} of table {table_name} is missing",
+                            table=table_name,
+                        )
+                    )
+
+        action = self.actions.get(action_name) if type(action_name) is str else None
+        if action is None:
+            errors.append(
+                ValidationIssue(
+                    UNKNOWN_ACTION,
+                    f"{action_name} is not an action of table {table_name}",
+                    table=table_name,
+                    hint=self.action_hint,
+                )
+            )
+            return errors
+
+        if action_params is None:
+            action_params = {}
+        if not isinstance(action_params, dict):
+            errors.append(
+                ValidationIssue(
+                    INVALID_ACTION_PARAMS,
+                    f'Action params should be a dict on format "parametername": "parameter value", got {type(action_params).__name__}',
+                    table=table_name,
+                    hint=action.hint,
+                )
+            )
+            return errors
+
+        params = action.params
+        for name, value in action_params.items():
+            bitwidth = params.get(name)
+            if bitwidth is None:
+                errors.append(
+                    ValidationIssue(
+                        UNKNOWN_ACTION_PARAM,
+                        f"{name} is not a param of action {action.name}",
+                        table=table_name,
+                        hint=action.hint,
+                    )
+                )
+                continue
+            if type(value) in (str, bytes):
+                int_value = _cached_value_to_int(value, bitwidth)
+            else:
+                int_value = value_to_int(value, bitwidth)
+            if int_value is None:
+                errors.append(
+                    ValidationIssue(
+                        INVALID_PARAM_VALUE,
+                        f"Action param {name}: {value!r} can not be encoded",
+                        table=table_name,
+                    )
+                )
+            elif not 0 <= int_value < 1 << bitwidth:
+                errors.append(
+                    ValidationIssue(
+                        INVALID_PARAM_VALUE,
+                        f"Action param {name}: {value!r} does not fit in {bitwidth} bits",
+                        table=table_name,
+                    )
+                )
+        for name in params:
+            if name not in action_params:
+                errors.append(
+                    ValidationIssue(
+                        MISSING_ACTION_PARAM,
+                        f"Action param {name} of action {action.name} is missing",
+                        table=table_name,
+                    )
+                )
+        return errors
+
+    def _match_field_hint(self):
+        if not self.match_fields:
+            return "The table has no match fields"
+        return "Match fields: " + ", ".join(
+            f"{field.name} ({field.type_name}, {field.bitwidth} bits)"
+            for field in self.match_fields.values()
+        )
+
+    def _action_hint(self):
+        names = {check.name for check in self.actions.values()}
+        return "Available actions: " + ", ".join(sorted(names))
+
+
+def _param_hint(params):
+    if not params:
+        return "The action takes no params"
+    return "Params: " + ", ".join(
+        f"{name} ({bitwidth} bits)" for name, bitwidth in params.items()
+    )
+
+
+class _InvalidValue(Exception):
+    pass
+
+
+def _check_match_value(field, value):
+    # Error message for a match field value, None if it is valid
+    try:
+        _match_value(field, value)
+    except _InvalidValue as e:
+        return str(e)
+    return None
+
+
+def _match_value(field, value):
+    match_type = field.match_type
+    bitwidth = field.bitwidth
+
+    if match_type in (MATCH_EXACT, MATCH_OPTIONAL):
+        # encode accepts a single value wrapped in a list
+        if type(value) in (list, tuple) and len(value) == 1:
+            value = value[0]
+        _field_int(value, field)
+        return
+
+    if type(value) not in (list, tuple) or len(value) != 2:
+        parts = {
+            MATCH_LPM: "[value, prefix_len]",
+            MATCH_TERNARY: "[value, mask]",
+            MATCH_RANGE: "[low, high]",
+        }.get(match_type)
+        if parts is None:
+            raise _InvalidValue(f"unsupported match type {field.type_name}")
+        raise _InvalidValue(
+            f"expected {parts} for {field.type_name} match, got {value!r}"
+        )
+
+    first = _field_int(value[0], field)
+    second = value[1]
+    if match_type == MATCH_LPM:
+        if type(second) is not int:
+            raise _InvalidValue(f"prefix length should be an int, got {second!r}")
+        if not 0 <= second <= bitwidth:
+            raise _InvalidValue(f"prefix length {second} is outside 0-{bitwidth}")
+        if first & ((1 << (bitwidth - second)) - 1):
+            raise _InvalidValue(
+                f"{value[0]!r} has bits set outside the /{second} prefix"
+            )
+        return
+
+    second = _field_int(second, field)
+    if match_type == MATCH_TERNARY:
+        if first & ~second:
+            raise _InvalidValue(
+                f"value {value[0]!r} has bits set outside the mask {value[1]!r}"
+            )
+    elif match_type == MATCH_RANGE:
+        if first > second:
+            raise _InvalidValue(f"range low {value[0]!r} is above high {value[1]!r}")
+    else:
+        raise _InvalidValue(f"unsupported match type {field.type_name}")
+
+
+def _field_int(value, field):
+    # The value as an int, raises _InvalidValue if it does not fit the field
+    if type(value) is int:
+        int_value = value
+    elif type(value) in (str, bytes):
+        int_value = _cached_value_to_int(value, field.bitwidth)
+    else:
+        int_value = None
+    if int_value is None:
+        raise _InvalidValue(
+            f"{value!r} can not be encoded as a {field.bitwidth} bit value"
+        )
+    if not 0 <= int_value < field.limit:
+        raise _InvalidValue(f"{value!r} does not fit in {field.bitwidth} bits")
+    return int_value
+
+
+# Addresses repeat a lot between the entries of a setup
+_cached_value_to_int = lru_cache(maxsize=1 << 16)(value_to_int)